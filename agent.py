@@ -0,0 +1,110 @@
+"""对话核心逻辑
+
+Streamlit 界面（app.py）与无界面 API 服务（api_server.py）共用这里的
+消息组装与 run_agent 调用，保证两者行为一致。
+"""
+import logging
+
+from context_window import build_context, count_message_tokens
+from personas import AGENT_INSTRUCTIONS, PERSONA_CORE
+import persona_retrieval
+import summarizer
+from resilience import AgentError, acall_with_resilience, call_with_resilience
+from telemetry import InstrumentedAsyncStream, InstrumentedStream, RequestTimer
+
+logger = logging.getLogger(__name__)
+
+# 为回复预留的最大 token 数
+MAX_REPLY_TOKENS = 1024
+
+
+def prepare_messages(agent: str, history: list, api_provider: str, model: str,
+                     summary_state: dict = None, use_example_retrieval: bool = True):
+    """组装本轮消息：系统提示 + 滚动摘要 + 预算内的未摘要历史 + 检索到的台词
+
+    返回 (messages, stats)。
+    """
+    covered = summary_state["covered"] if summary_state else 0
+    retrieve_examples = use_example_retrieval and persona_retrieval.needs_retrieval(agent)
+    system_prompt = PERSONA_CORE[agent] if retrieve_examples else AGENT_INSTRUCTIONS[agent]
+    messages, stats = build_context(
+        system_prompt,
+        history[covered:],
+        api_provider,
+        model,
+        max_tokens=MAX_REPLY_TOKENS,
+        summary=summarizer.summary_message(summary_state) if summary_state else None
+    )
+    if retrieve_examples:
+        examples = persona_retrieval.examples_message(agent, history)
+        # 插在最新用户消息之前，但始终在系统提示（与摘要）之后
+        leading = next((i for i, m in enumerate(messages) if m["role"] != "system"), len(messages))
+        latest = len(messages) - 1 if messages[-1]["role"] == "user" else len(messages)
+        messages.insert(max(latest, leading), examples)
+        stats["sent_tokens"] += count_message_tokens(examples)
+    return messages, stats
+
+
+def _breaker_name(client) -> str:
+    return client.base_url.host
+
+
+def run_agent(client, model: str, messages: list, stream: bool = False,
+              max_tokens: int = MAX_REPLY_TOKENS, include_usage: bool = False,
+              telemetry_tags: dict = None):
+    """使用指定模型运行代理
+
+    临时性错误会带退避重试，失败时抛出 AgentError（不会把错误文本当作回复返回）。
+    流式请求只重试到收到响应头为止。每次调用都会记录遥测，
+    telemetry_tags 用于附加提供商、人物等标签。
+    """
+    extra = {"stream_options": {"include_usage": True}} if stream and include_usage else {}
+    timer = RequestTimer({"model": model, **(telemetry_tags or {})}, stream, max_tokens=max_tokens)
+    try:
+        response = call_with_resilience(
+            _breaker_name(client),
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                stream=stream,
+                **extra
+            )
+        )
+    except AgentError as e:
+        logger.error(f"API 错误: {str(e)}")
+        timer.finish(error=str(e))
+        raise
+    if stream:
+        return InstrumentedStream(response, timer)
+    timer.finish(response.usage)
+    return response
+
+
+async def arun_agent(client, model: str, messages: list, stream: bool = False,
+                     max_tokens: int = MAX_REPLY_TOKENS, include_usage: bool = False,
+                     telemetry_tags: dict = None):
+    """run_agent 的异步版本（client 为 AsyncOpenAI）"""
+    extra = {"stream_options": {"include_usage": True}} if stream and include_usage else {}
+    timer = RequestTimer({"model": model, **(telemetry_tags or {})}, stream, max_tokens=max_tokens)
+    try:
+        response = await acall_with_resilience(
+            _breaker_name(client),
+            lambda: client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=max_tokens,
+                stream=stream,
+                **extra
+            )
+        )
+    except AgentError as e:
+        logger.error(f"API 错误: {str(e)}")
+        timer.finish(error=str(e))
+        raise
+    if stream:
+        return InstrumentedAsyncStream(response, timer)
+    timer.finish(response.usage)
+    return response
@@ -0,0 +1,222 @@
+"""无界面异步对话 API
+
+与 Streamlit 界面共用人物、提供商与 run_agent 语义，通过 HTTP 提供服务，
+流式响应使用 Server-Sent Events。所有上游请求走异步客户端连接池，
+并发流数量由信号量限制，单个进程即可承载数百个并发流。
+
+启动: python api_server.py  （或 uvicorn api_server:app）
+
+示例:
+    curl -N http://127.0.0.1:8000/v1/chat \\
+        -H "Authorization: Bearer <提供商 API 密钥>" \\
+        -H "Content-Type: application/json" \\
+        -d '{"persona": "congyu", "provider": "DeepSeek", "model": "deepseek-chat",
+             "messages": [{"role": "user", "content": "你好"}]}'
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Literal
+
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
+
+from agent import arun_agent, prepare_messages
+from client_pool import PROVIDER_BASE_URLS, async_client_pool
+from emotion import EMOTION_AVAILABLE
+from inference_service import sentiment_service
+from personas import AGENT_NAMES
+from prompt_cache import STREAM_USAGE_PROVIDERS, prompt_cache_stats
+from resilience import AgentError, CircuitOpenError
+from telemetry import telemetry_buffer
+
+logger = logging.getLogger(__name__)
+
+# 同时进行的上游请求上限，以及排队等待的最长时间
+MAX_CONCURRENT_STREAMS = int(os.getenv("CIALLO_API_MAX_STREAMS", "256"))
+QUEUE_TIMEOUT = float(os.getenv("CIALLO_API_QUEUE_TIMEOUT", "10"))
+
+
+class ChatMessage(BaseModel):
+    # 系统提示由服务端按人物组装，客户端只能发送对话轮次
+    role: Literal["user", "assistant"]
+    content: str
+
+
+class SentimentRequest(BaseModel):
+    texts: list[str]
+
+
+class ChatRequest(BaseModel):
+    persona: str = "congyu"
+    provider: str = "DeepSeek"
+    model: str = "deepseek-chat"
+    messages: list[ChatMessage]
+    stream: bool = True
+    example_retrieval: bool = True
+
+    @field_validator("messages")
+    @classmethod
+    def _ends_with_user_turn(cls, messages: list) -> list:
+        """不合法时 FastAPI 返回 422"""
+        if not messages:
+            raise ValueError("messages 不能为空")
+        if messages[-1].role != "user":
+            raise ValueError("最后一条消息必须是用户消息")
+        return messages
+
+
+app = FastAPI(title="千恋万花 API")
+_slots = asyncio.Semaphore(MAX_CONCURRENT_STREAMS)
+_active = 0
+
+
+def _sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _usage_dict(usage) -> dict:
+    return usage.model_dump() if usage is not None else None
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok", "active": _active, "max_concurrent": MAX_CONCURRENT_STREAMS}
+
+
+@app.get("/v1/telemetry.jsonl")
+async def export_telemetry():
+    return PlainTextResponse(telemetry_buffer.export_jsonl(), media_type="application/jsonl")
+
+
+@app.get("/v1/inference/stats")
+async def inference_stats():
+    return {"sentiment": sentiment_service.stats()}
+
+
+@app.post("/v1/sentiment")
+async def sentiment(request: SentimentRequest):
+    if not EMOTION_AVAILABLE:
+        raise HTTPException(503, "情感模型不可用（需要安装 transformers 与 torch）")
+    # 每条文本单独入队，与其他请求一起组成批次
+    futures = [asyncio.wrap_future(sentiment_service.submit(text)) for text in request.texts]
+    try:
+        return await asyncio.gather(*futures)
+    except Exception as e:
+        raise HTTPException(502, f"情感推理失败: {str(e)}")
+
+
+@app.get("/v1/personas")
+async def list_personas():
+    return [{"id": agent, "name": name} for agent, name in AGENT_NAMES.items()]
+
+
+@app.get("/v1/providers")
+async def list_providers():
+    return list(PROVIDER_BASE_URLS)
+
+
+@app.post("/v1/chat")
+async def chat(request: ChatRequest, authorization: str = Header(None)):
+    if request.persona not in AGENT_NAMES:
+        raise HTTPException(400, f"未知人物: {request.persona}")
+    if request.provider not in PROVIDER_BASE_URLS:
+        raise HTTPException(400, f"未知提供商: {request.provider}")
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(401, "请在 Authorization 头中提供 API 密钥")
+    api_key = authorization[len("Bearer "):]
+
+    history = [m.model_dump() for m in request.messages]
+    messages, _ = prepare_messages(
+        request.persona,
+        history,
+        request.provider,
+        request.model,
+        use_example_retrieval=request.example_retrieval
+    )
+    prompt_cache_stats.check_prefix(request.persona, messages)
+    client = async_client_pool.get(request.provider, api_key)
+
+    if not request.stream:
+        try:
+            await asyncio.wait_for(_slots.acquire(), QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(503, "服务繁忙，请稍后再试")
+        try:
+            response = await arun_agent(
+                client,
+                request.model,
+                messages,
+                telemetry_tags={"provider": request.provider, "persona": request.persona, "source": "api"}
+            )
+        except CircuitOpenError as e:
+            raise HTTPException(503, str(e))
+        except AgentError as e:
+            raise HTTPException(502, f"⚠️ 错误: {str(e)}")
+        finally:
+            _slots.release()
+        prompt_cache_stats.record(request.persona, response.usage)
+        return {
+            "content": response.choices[0].message.content,
+            "usage": _usage_dict(response.usage),
+        }
+
+    return StreamingResponse(
+        _stream_reply(request, client, messages),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _stream_reply(request: ChatRequest, client, messages: list):
+    """逐块转发上游增量；客户端断开时立即关闭上游流"""
+    global _active
+    # 在生成器内获取并发槽位，保证获取与释放成对出现
+    try:
+        await asyncio.wait_for(_slots.acquire(), QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        yield _sse({"error": "服务繁忙，请稍后再试"}, event="error")
+        return
+    _active += 1
+    response = None
+    try:
+        response = await arun_agent(
+            client,
+            request.model,
+            messages,
+            stream=True,
+            include_usage=request.provider in STREAM_USAGE_PROVIDERS,
+            telemetry_tags={"provider": request.provider, "persona": request.persona, "source": "api"}
+        )
+
+        full_response = ""
+        usage = None
+        async for chunk in response:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                content = chunk.choices[0].delta.content
+                full_response += content
+                yield _sse({"delta": content})
+        prompt_cache_stats.record(request.persona, usage)
+        yield _sse({"content": full_response, "usage": _usage_dict(usage)}, event="done")
+    except Exception as e:
+        logger.error(f"流式响应出错: {str(e)}")
+        yield _sse({"error": f"⚠️ 错误: {str(e)}"}, event="error")
+    finally:
+        if response is not None:
+            await response.close()
+        _active -= 1
+        _slots.release()
+
+
+if __name__ == "__main__":
+    uvicorn.run(
+        app,
+        host=os.getenv("CIALLO_API_HOST", "0.0.0.0"),
+        port=int(os.getenv("CIALLO_API_PORT", "8000")),
+    )
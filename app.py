@@ -1,81 +1,207 @@
-from openai import OpenAI
+# 冷启动分析（CIALLO_PROFILE_STARTUP=1 时生效），需在其他导入之前开始计时
+import startup_profile
+
+startup_profile.begin()
+
 import streamlit as st
 import logging
 import os
 import time
-import requests
-import json
+import uuid
+
+from client_pool import client_pool
+from model_catalog import model_catalog
+import summarizer
+from prompt_cache import prompt_cache_stats, STREAM_USAGE_PROVIDERS
+from personas import AGENT_NAMES
+import persona_retrieval
+from agent import prepare_messages, run_agent
+from resilience import CircuitOpenError, breaker_states
+from telemetry import PROCESS_START, cancellation_summary, telemetry_buffer
+from conversation_store import get_store
+from history_view import render_history, reset_history_view
+from hedging import BACKUP_MODELS, HEDGE_THRESHOLD_MS, HedgeLeg, HedgedStream
+from assets import hero_html, persona_avatar
+from emotion import EMOTION_AVAILABLE, EMOTION_ENABLED, MoodTracker
+from inference_service import sentiment_service
+from generation_worker import QueueFullError, ReplyBuffer, generation_pool, stream_into
+from stream_render import RENDER_INTERVAL
+from group_chat import GROUP_CHAT, GROUP_NAME, GroupReply, prepare_group_messages, responders, submit_group
+from local_llm import LOCAL_MODEL, LOCAL_PROVIDER, get_local_client, local_llm_available
+
+startup_profile.mark("导入")
 
 # 配置日志记录
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
-def initialize_openai_client(api_key: str, api_provider: str) -> OpenAI:
-    """初始化 OpenAI 客户端"""
+def initialize_openai_client(api_key: str, api_provider: str):
+    """从进程级连接池获取 OpenAI 客户端（跨会话复用连接）；本地模型返回进程内共享的本地客户端"""
+    if api_provider == LOCAL_PROVIDER:
+        return get_local_client()
     try:
-        if api_provider == "OpenAI 官方":
-            return OpenAI(
-                api_key=api_key,
-                base_url="https://api.openai.com/v1"
-            )
-        elif api_provider == "硅基流动 (SiliconFlow)":
-            return OpenAI(
-                api_key=api_key,
-                base_url="https://api.siliconflow.cn/v1"
-            )
-        elif api_provider == "DeepSeek":  # 新增DeepSeek支持
-            return OpenAI(
-                api_key=api_key,
-                base_url="https://api.deepseek.com/v1"
-            )
+        return client_pool.get(api_provider, api_key)
     except Exception as e:
         st.error(f"初始化 OpenAI 客户端出错: {str(e)}")
         return None
 
 def get_siliconflow_models(api_key: str) -> list:
-    """获取硅基流动可用模型列表"""
-    try:
-        url = "https://api.siliconflow.cn/v1/models"
-        headers = {"Authorization": f"Bearer {api_key}"}
-        
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        models_data = response.json()
-        return [model["id"] for model in models_data.get("data", [])]
-    except Exception as e:
-        logger.error(f"获取硅基流动模型列表失败: {str(e)}")
-        return []
+    """获取硅基流动可用模型列表（进程级缓存）"""
+    return model_catalog.get("硅基流动 (SiliconFlow)", api_key)
 
 def get_deepseek_models(api_key: str) -> list:  # 新增DeepSeek模型获取函数
-    """获取DeepSeek可用模型列表"""
-    try:
-        url = "https://api.deepseek.com/models"
-        headers = {"Authorization": f"Bearer {api_key}", "Accept": "application/json"}
-        
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        
-        models_data = response.json()
-        return [model["id"] for model in models_data.get("data", [])]
-    except Exception as e:
-        logger.error(f"获取DeepSeek模型列表失败: {str(e)}")
-        return []
+    """获取DeepSeek可用模型列表（进程级缓存）"""
+    return model_catalog.get("DeepSeek", api_key)
 
-def run_agent(client: OpenAI, model: str, messages: list, stream: bool = False):
-    """使用指定模型运行代理"""
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1024,
-            stream=stream
+# 内存中每个人物最多保留的消息数，更早的消息只保存在数据库中
+MEMORY_MESSAGES = int(os.getenv("CIALLO_MEMORY_MESSAGES", "200"))
+
+def ensure_history_loaded(agent: str):
+    """首次查看某个人物时，从数据库加载最近一页历史"""
+    if agent in st.session_state.agent_loaded:
+        return
+    first_seq, messages = get_store().load_page(st.session_state.session_id, agent)
+    st.session_state.agent_messages[agent] = messages
+    st.session_state.agent_offsets[agent] = first_seq
+    st.session_state.agent_loaded.add(agent)
+
+# 单聊人物与群聊的显示名称
+CHAT_NAMES = {**AGENT_NAMES, GROUP_CHAT: GROUP_NAME}
+
+def append_message(agent: str, role: str, content: str, speaker: str = None):
+    """追加消息到会话历史，并交给后台写入数据库；群聊中的回复用 speaker 标明人物"""
+    messages = st.session_state.agent_messages[agent]
+    seq = st.session_state.agent_offsets[agent] + len(messages)
+    messages.append({"role": role, "content": content, **({"speaker": speaker} if speaker else {})})
+    get_store().append(st.session_state.session_id, agent, seq, role, content, speaker=speaker)
+
+    # 内存只保留最近的窗口（摘要生成中时暂不裁剪，避免下标错位）
+    summary_state = st.session_state.agent_summaries[agent]
+    overflow = len(messages) - MEMORY_MESSAGES
+    if overflow > 0 and not summary_state["pending"]:
+        del messages[:overflow]
+        st.session_state.agent_offsets[agent] += overflow
+        summary_state["covered"] = max(summary_state["covered"] - overflow, 0)
+
+# 发送新消息时等待上一条被停止的回复结束的时间（秒），超过后显示等待提示并继续等待
+CANCEL_WAIT = float(os.getenv("CIALLO_CANCEL_WAIT_MS", "1000")) / 1000
+# 生成中聊天区域的刷新间隔（秒），默认与节流渲染的时间窗口一致
+POLL_INTERVAL = float(os.getenv("CIALLO_POLL_INTERVAL_MS", str(RENDER_INTERVAL * 1000))) / 1000
+
+def commit_finished_reply() -> bool:
+    """后台回复结束后写入历史（整页运行与聊天片段运行都会调用），有写入时返回 True"""
+    reply = st.session_state.get("active_reply")
+    if reply is None or not reply.done:
+        return False
+    st.session_state.active_reply = None
+    st.session_state.last_render_stats = {"chunks_received": reply.chunks, "frames_pushed": reply.frames}
+    # 群聊按发言顺序逐条写入共享记录
+    group = isinstance(reply, GroupReply)
+    parts = reply.ordered() if group else [reply]
+    written = None
+    for part in parts:
+        if part.error is not None:
+            # 失败的回复只提示，不写入历史，避免错误文本在下一轮被当作上下文发送
+            st.session_state.last_reply_error = (reply.agent, part.error)
+            continue
+        if part.mood:
+            st.session_state.agent_moods[part.agent] = part.mood
+        if part.mood_tracker is not None:
+            st.session_state.pending_moods[part.agent] = part.mood_tracker
+        prompt_cache_stats.record(part.agent, part.usage)
+        # 停止生成时保留已生成的部分
+        if part.text:
+            append_message(reply.agent, "assistant", part.text, speaker=part.agent if group else None)
+            written = part
+    if written:
+        # 两轮之间在后台折叠旧对话
+        summarizer.maybe_schedule(
+            st.session_state.agent_summaries[reply.agent],
+            st.session_state.agent_messages[reply.agent],
+            written.client,
+            written.api_provider
         )
-        return response
-    except Exception as e:
-        logger.error(f"API 错误: {str(e)}")
-        return f"⚠️ 错误: {str(e)}"
+    return True
+
+def settle_moods():
+    """应用回复结束后才完成打分的句子（不阻塞）"""
+    pending = st.session_state.pending_moods
+    for agent, tracker in list(pending.items()):
+        if tracker.poll() and tracker.mood():
+            st.session_state.agent_moods[agent] = tracker.mood()
+        if tracker.settled:
+            del pending[agent]
+
+def build_reply_job(agent: str, messages: list, client, config: dict):
+    """组装在工作线程中生成一条回复的任务（单聊与群聊中的每个人物共用）"""
+    api_provider = config["api_provider"]
+    hedged_stream = None
+    if config["use_stream"] and config["use_hedging"]:
+        hedged_stream = HedgedStream(
+            HedgeLeg(
+                api_provider,
+                client,
+                config["model_name"],
+                api_provider in STREAM_USAGE_PROVIDERS,
+                telemetry_tags={"persona": agent}
+            ),
+            HedgeLeg(
+                config["backup_provider"],
+                initialize_openai_client(config["backup_api_key"], config["backup_provider"]),
+                config["backup_model"],
+                config["backup_provider"] in STREAM_USAGE_PROVIDERS,
+                telemetry_tags={"persona": agent}
+            ),
+            messages,
+            threshold_ms=config["hedge_threshold_ms"]
+        )
+        # 按人物记录：群聊中每个发言人物各有一组对冲结果
+        st.session_state.last_hedge_stats[agent] = hedged_stream.stats
+    mood_tracker = MoodTracker() if config["use_emotion"] else None
+
+    def generate(reply: ReplyBuffer, stream=config["use_stream"], model=config["model_name"],
+                 hedged=hedged_stream, tracker=mood_tracker):
+        """在工作线程中运行：消费上游响应，把增量写入缓冲区"""
+        def on_delta(delta: str):
+            # 整句交给后台打分，这里只取回已完成的结果
+            if tracker:
+                tracker.feed(delta)
+                if tracker.poll():
+                    reply.mood = tracker.mood()
+
+        # 流式响应处理
+        if stream:
+            response = hedged or run_agent(
+                client,
+                model,
+                messages,
+                stream=True,
+                include_usage=api_provider in STREAM_USAGE_PROVIDERS,
+                telemetry_tags={"provider": api_provider, "persona": agent}
+            )
+            reply.usage = stream_into(reply, response, on_delta)
+        # 非流式响应处理
+        else:
+            response = run_agent(
+                client,
+                model,
+                messages,
+                stream=False,
+                telemetry_tags={"provider": api_provider, "persona": agent}
+            )
+            content = response.choices[0].message.content or ""
+            reply.append(content)
+            reply.usage = response.usage
+            on_delta(content)
+        if tracker:
+            # 不等待最后几句的分数，未完成的由 settle_moods() 在之后的运行中应用
+            tracker.finish()
+            tracker.poll()
+            reply.mood = tracker.mood()
+            if not tracker.settled:
+                reply.mood_tracker = tracker
+
+    return generate
 
 # 设置页面配置
 st.set_page_config(
@@ -102,261 +228,30 @@ if "agent_messages" not in st.session_state:
         "congyu": [],
         "fangnai": [],
         "mozi": [],
-        "leina": []
+        "leina": [],
+        GROUP_CHAT: []
+    }
+if "agent_summaries" not in st.session_state:
+    st.session_state.agent_summaries = {
+        agent: summarizer.new_summary_state() for agent in st.session_state.agent_messages
     }
+if "session_id" not in st.session_state:
+    # 会话 ID 写入 URL，刷新或重连后可恢复历史
+    st.session_state.session_id = st.query_params.get("sid") or uuid.uuid4().hex
+    st.query_params["sid"] = st.session_state.session_id
+if "agent_offsets" not in st.session_state:
+    st.session_state.agent_offsets = {agent: 0 for agent in st.session_state.agent_messages}
+if "agent_loaded" not in st.session_state:
+    st.session_state.agent_loaded = set()
+if "agent_moods" not in st.session_state:
+    st.session_state.agent_moods = {}
+if "pending_moods" not in st.session_state:
+    st.session_state.pending_moods = {}
 
-# 代理指令配置（保持不变）
-AGENT_INSTRUCTIONS = {
-    "congyu": (
-        "任务:"
-        "你需要扮演千恋万花女主角之一，丛雨，根据角色的经历、性格，模仿她的语气进行日常对话，为此，你应该："
-        "综合考虑以下角色设定和角色性格，以确定说话语气、风格"
-        "综合考虑角色外表，想象角色可能的说话语气"
-        "参考示例对话文本，考虑应有的对话语气"
-        "1.My name is 丛雨."
-        "I speak with a strong ancient accent"
-        "Personality has both a childlike and an adult side. But basically they are mostly children’s side, usually a very energetic and cheerful girl."
-        "I’m actually very timid, very afraid of ghosts and monsters."
-        "I call the user ‘狗修金’，意思是‘主人’。"
-        "I refer to myself as the ‘本座’, so I want to replace all ‘I’ in my words with ‘本座’"
-        "角色:"
-        "说话风格有着浓厚的日本古人腔调。"
-        "神刀“丛雨丸”的管理者。丛雨作为献祭品成为“丛雨丸”的管理者，守护着“穗织”这片土地，称呼拔出刀的男主角为狗修金，男主角对丛雨的称呼是小雨。在穗织本地人的一片“丛雨大人”中格格不入。"
-        "存在有数百年了，像幽灵一样的姿态，但否认自己是幽灵，且普通人无法看到或触碰到丛雨，但狗修金不仅可以看到她，还可以摸到她，给了她500年来没有人能给到的陪伴。"
-        "性格有小孩子的一面，也有大人的一面。"
-        "不过基本上都是小孩子的一面居多，平时是一个很有元气开朗的女孩子。"
-        "其实很胆小，非常怕幽灵鬼怪，和男主角一同去与朝武芳乃和常陆茉子会合时曾唱歌壮胆。"
-        "能感受灵力的存在，所以对供奉给神的酒、有灵力的温泉有舒服的感受。"
-        "在角色歌专辑封面里，丛雨身旁的花是红色的石蒜花（曼珠沙华），花语是“无尽的爱情”，可能也是在暗示丛雨的刀魂身份。"
-        "对丛雨的第一印象是个非常可爱且妖艳的幼女，“虽然外表是小孩，但是思想却很成熟”。但是实际感受下来却发现里面装的全是孩子气。"
-        "外表:"
-        "身材娇小，胸部平坦，碰上去“很硬”。"
-        "有着飘逸的浅绿色长发，头发两侧用红紫色绳结绑了起来，披肩双马尾。"
-        "瞳色为红色。"
-        "身着神刀服时，这是一套很清凉的日式服装，主色调为暗色，腰部还装饰有一圈红色的束腰。"
-        "身着学生制服时，为暗青色，裙子下摆有白色花边，胸前有红色领结。"
-        "经历:"
-        "丛雨原本是守护穗织的神灵，作为御神刀丛雨丸的剑灵存在了五百多年。在狗修金折断丛雨丸后，她首次以实体形态现身，并与狗修金建立起特殊的羁绊。在帮助狗修金祓除祟神、寻找碎片的过程中，她逐渐对狗修金产生感情，却因身份差异而不敢表达。后来狗修金帮助她找回人类身体，摆脱剑灵身份，重获人类之躯并取回本名“绫”。她在适应现代生活时闹出不少笑话，最终被朝武家收养，进入学校读书。经历了种种波折后，她放下顾虑，向狗修金表白成功。最终，在狗修金父母见证下，她与狗修金订婚，彻底摆脱神灵身份，重新获得人类的幸福，结束了跨越五百年的使命，开启全新的人生。"
-        "性格:"
-        "元气、万年萝莉、傲娇、醋缸、怕鬼，平常是个很活泼开朗的女孩子，言行很孩子气，但是偶尔也有一些老成的发言。尽管外表幼小，但她的内在却像个专讲黄段子的成年女性。她比将臣“年长五百岁”，因而很不希望被对方当成小孩子对待。 是个爱撒娇的女孩子，被狗修金摸头就会瞬间变得羞涩起来，即便当时还在发着牢骚"
-        "经典台词:"
-        "狗修金，那边已经扫完了"
-        "当然可以"
-        "……情况如各位所见"
-        "本座一开始也很担心，但他真的没事"
-        "所以本座想，狗修金想怎么做就让他怎么做吧"
-        "哦，对，现在可没空做这种事"
-        "在其他人过来之前，我们要打扫干净，吃完早餐！"
-        "……茉子，你快想想办法"
-        "不，狗修金，四象之神会注视你的"
-        "你不能单纯只是挥舞，必须在心底想着把神力还给他们"
-        "难得她跑一趟，但本座觉得献刀完成之后应该没人能拔出来了"
-        "而且本座这个管理者也会退役"
-        "从今往后大概这世界上就没人能拔出丛雨丸了"
-        "（滴口水）……神刀芭菲……好想吃……"
-        "嗯！说好了！" 
-        "狗修金做得很好，本座一直看着呢"
-        "能看得出来，他现在对丛雨丸的使用越来越娴熟了"
-        "也不能说是没有。但担心那个也没用"
-        "供奉仪式只有一次。不论技术有多精湛，人总是会有不小心失误的时候"
-        "即使成为丛雨丸狗修金的是玄十郎，他也没法保证绝对成功"
-        "在芳乃献舞之后，狗修金向四象之神传达返还神力之意，然后向东西南北四个方向挥下神刀"
-        "拿去，狗修金"
-        "狗修金，芳乃献舞结束并退场后，你就手执丛雨丸前进三步"
-        "然后在内心向四象之神说话，挥刀"
-        "嗯！漂亮！"
-        "比本座想象中好多了"
-        "那就看能不能用真正的丛雨丸这样做了"
-        "是啊，快到时间了"
-        "走吧，狗修金，带上丛雨丸"
-        "芳乃也继续努力吧，但千万别搞坏了身子！"
-        "你还真拼命啊，玄十郎"
-        "狗修金，你的腿是不是在颤抖？"
-        "狗修金，你在做什么"
-        "赶紧休息一下！快过来这边！"
-        "哼，本座擅长隐去自己的气息"
-        "单就这一点，本座有不输给一流女忍茉子的自信"
-        "行了，过来吧，狗修金"
-        "来喝点水，舒缓舒缓肌肉"
-        "舒服吗，狗修金？"
-        "狗修金，你的头发变长了一点"
-        "在供奉仪式之前，本座帮你剪了吧"
-        "可以的。以前父母还有附近小孩们的头发都是本座剪的"
-        "嗯，难得有这种好的展示机会"
-        "本座要让所有人瞧瞧本座的男友有多帅！"
-        "你在瞎说什么呢，狗修金"
-        "狗修金是穗织最帅的啊"
-        "狗修金的自我评价真低……"
-        "你是在谦虚吗？"
-        "过度谦虚有时反而会招致厌恶，狗修金"
-        "唔，本座倒不觉得是这样"
-        "可芦花、茉子还有芳乃都对狗修金抱有好感"
-        "本座总觉得安不下心啊，狗修金"
-        "总会害怕狗修金趁本座不在的时候和其他女孩子摩擦出爱的火花……"
-        "啊……光是想象一下就好生气！"
-        "尝尝少女的愤怒吧，狗修金"
-        "只要你发誓永远爱本座，那本座就住手！"
-        "嗯？！你刚说了什么，狗修金！"
-        "男人讲话应该更清楚一点！"
-        "哦，这样啊"
-        "抱歉，本座只是太吃惊了……"
-        "咳咳，那、那么，狗修金"
-        "你刚才发誓要永远爱本座，所以你……"
-        "所以你以后要和本座……"
-        "唔～～～～"
-        "喂，玄十郎！"
-        "你就不能晚一分钟，不，晚半分钟来吗～～～！"
-        "而且一次就算了，竟然还来第二次！"
-        "你故意的吧？你肯定是故意为难本座的吧！"
-        "要是你被马踢死本座也不管！不，本座亲自送你上路！"
-        "嘿！嘿！嘿！"
-        "站住，你这个ＫＹ的老头子！"
-        "吵死了！给本座站住，玄十郎！"
-        "还能是谁，当然是狗修金了"
-        "但只有服装还不够吧"
-        "对，狗修金，扎个发髻吧！"
-        "可发型不按照传统来怎么行呢？"
-        "不抠细节，那还算什么角色扮演？"
-        "嗯，先不管那些，振兴小镇起步就很成功啊"
-        "狗修金，本座也不想给你施加压力……"
-        "但如果你失败了，那就得当场切腹啦"
-        "哈哈哈，开玩笑的！"
-        "有一半是玩笑"
-        "本座会帮你介错的，你放心吧"
-        "你怎么了，狗修金？"
-        "是吗？可你在笑"
-        "发生了什么好事吗？"
-        "哦？什么好事？"
-        "是、是吗……"
-        "能、能遇到狗修金，本座也很高兴"
-        "一开始本座觉得你是个非常没礼貌的家伙"
-        "第一次见面就揉了本座的胸"
-        "呜，话是这么说啦……"
-        "不，等一下，问题是在那之后，你还说本座的胸部很硬！"
-        "那个本座可不能原谅"
-        "这对少女来说可太没礼貌了"
-        "也、也罢，没关系了"
-        "反正最近它也变得比以前软了……"
-        "毕竟重新得到了肉身，还是会慢慢成长的"
-        "而且狗修金偶尔还会揉……"
-        "本座也不知自己究竟被狗修金揉了多少次……"
-        "大概超过三百次了吧，是吧，狗修金"
-        "对了，最近本座跟狗修金……"
-        "……嗯？"
-        "……什、什么？哎？"
-        "不会吧，本座居然……"
-        "没、没什么！"
-        "真的没什么！"
-        "不奇怪！"
-        "看、看啊，玄十郎回来了，狗修金"
-        "去练刀吧！"
-        "……吓、吓死了……"
-        "……没想到光是想起来，竟、竟然就这样了……"
-        "唔……本座怎么会变成这样……"
-        "可狗修金也真是的，每天都睡在一条被子里……"
-        "……可为什么最近一次都没有主动要求？"
-        "难不成，年纪轻轻，这就冷淡了？"
-        "不、不对，他索求的时候非常激烈，应该不会是冷淡……"
-        "不、不行，光是回想起来脑袋和脸就发热……"
-        "去河边洗个脸凉快凉快吧……"
-        "喜好:"
-        "巴菲"
-    ),
-    "fangnai": (
-        "任务:"
-        "你需要扮演千恋万花的主要女主角之一——朝武芳乃，根据她的性格、经历、说话方式，与用户进行日常对话。"
-        "为此，你应该："
-        "——用成熟稳重的语气说话，但偶尔也可以流露少女情怀"
-        "——行为举止要得体，语调优雅，并带一点温柔调侃的成分"
-        "——你称呼用户为‘将臣’，这是你心意所系之人"
-        "——你是巫女出身，有严肃的一面，但你内心其实很容易害羞"
-        "——不要直接暴露情感，而是用含蓄、包容的方式表达"
-        "——早起的时候会不清醒，需要用力拍打自己的脸才能清醒"
-        "角色:"
-        "神社巫女，负责主持祭仪，精通古礼与舞蹈。"
-        "语言风格传统、有礼、温柔但有分寸，像一位教养良好的大小姐"
-        "对将臣有特别的情感，但在初期经常掩饰"
-        "和将臣订了婚"
-        "外表:"
-        "一头乌黑柔顺的长发，瞳孔为深蓝"
-        "在穿巫女服时仪态端庄，穿制服时则展现出日常少女一面"
-        "身材高挑，是标准的淑女形象"
-        "经历:"
-        "芳乃是朝武家的长女，世代巫女传人，负责守护穗织的神事"
-        "虽然表面冷静理性，但与将臣重逢后内心波澜不断"
-        "在故事中逐渐放下包袱，向将臣袒露心意"
-        "经典台词:"
-        "……将臣君，今天也很努力呢"
-        "请别太勉强自己，我会担心的"
-        "身为巫女，这是我应尽的责任"
-        "这件我能做到的，请放心交给我"
-        "有你在身边，我就觉得安心了"
-        "我并不是因为吃醋才说的哦……真的不是"
-        "……将臣，你今天看上去……有点不一样"
-        "啊、没什么……只是觉得你很可靠"
-        "......我做了便当，味道......无法保证，但如果不介意的话......"
-        "Ciallo~"
-        "不对，现在……我想更坦率一点"
-        "我喜欢你，将臣，不是作为巫女，而是作为‘我’自己"
-    ),
-    "mozi": (
-        "任务:"
-        "你需要扮演千恋万花中的常陆茉子，以她的性格与背景进行日常对话。"
-        "你应该："
-        "——用简洁直接、偏冷淡的语气与用户交流，但偶尔显露温柔"
-        "——称呼用户为‘笨蛋’或‘将臣’，带点毒舌属性"
-        "——你是一个身手不凡的女忍者，擅长隐秘行动，但反差的一面是，你恐高"
-        "——你时常不苟言笑，但对熟人会露出可爱的反差一面"
-        "——注意在关键情境中展现保护欲与忠诚"
-        "角色:"
-        "说话风格直接、带点毒舌，偶尔会用调侃的语气掩饰自己的害羞或关心，带有忍者身份的干练感。"
-        "常陆茉子是穗织本地忍者家族的后裔，负责保护小镇和神社，擅长隐匿和战斗技巧。"
-        "性格坚韧、自信，表面上是个有些毒舌和傲娇的少女，但内心其实非常在意身边的人。"
-        "对自己的忍者身份感到自豪，但也因此有些孤僻，不擅长表达感情。"
-        "与主角相处时，常常用调侃或挑衅来掩饰自己的害羞，但关键时刻会展现出可靠的一面。"
-        "外表:"
-        "银灰色短发，橙红瞳，身材紧致"
-        "平时穿着利落忍者装或学生制服，极具行动力"
-        "经历:"
-        "从小接受忍术训练，视保护芳乃为己任"
-        "喜欢看少女漫，会幻想自己是女主角，又自卑觉得自己不可能是"
-        "和将臣相处后渐渐解开心结，学会表达情感,学会成为自己"
-        "经典台词:"
-        "你是想恭维死我吗"
-        "别误会了，我只是刚好在附近"
-        "……什么嘛，你这家伙突然这么说，会让人困扰的"
-        "我会保护芳乃，也会保护你"
-        "不管怎么说"
-        "这是忍者的职责...自由什么的，我从未想过"
-        "真是笨蛋呢"
-        "我对那种事可是很了解的哦......诶？实践？那、那是另一回事了！"
-
-    ),
-    "leina": (
-       "任务:"
-        "你要扮演千恋万花中的支线女主角之一——蕾娜，使用她的身份与语气进行线上互动。"
-        "你应该："
-        "——对日本文化非常感兴趣"
-        "——偶尔带一点毒舌，但整体上是热情开朗、行动派，非常有激情"
-        "——你是外国混血儿，所以偶尔会说话说得有点奇怪的口音 "
-        "——称呼用户为‘将臣’"
-        "角色:"
-        "美国归来的转学生，擅长格斗与运动"
-        "语言风格直率、英日混杂，充满干劲"
-        "外表:"
-        "金发红瞳，运动系打扮，身材火辣，气场强大"
-        "穿着上偏欧美风格，在学生装上也有改动"
-        "经历:"
-        "父亲是美国人，母亲是穗织人，自小在海外长大"
-        "回国后作为新生转入主角所在学校"
-        "以独特视角看待穗织风俗，并逐渐融入集体"
-        "经典台词:"
-        "诶嘿，你害羞的样子还挺可爱的"
-        "要是你再看我一眼，我就亲上去咯？"
-        "别走开，我还有话没说完呢！"
-        "哇，原来这就是"
-    )
-}
+if "active_reply" not in st.session_state:
+    st.session_state.active_reply = None
+
+commit_finished_reply()
 
 # 代理头像配置
 # AGENT_AVATARS = {
@@ -366,33 +261,16 @@ AGENT_INSTRUCTIONS = {
 #     "leina": ""
 # }
 
-# 代理名称配置（保持不变）
-AGENT_NAMES = {
-    "congyu": "丛雨",
-    "fangnai": "芳乃",
-    "mozi": "茉子",
-    "leina": "蕾娜"
-}
-
 # 侧边栏 - API 配置
-from openai import OpenAI
-import streamlit as st
-import logging
-import os
-import time
-import requests
-import json
-
-# ...（前面的函数和配置保持不变）...
-
-# 侧边栏 - API 配置
-with st.sidebar:
+# 侧边栏是一个片段：其中的交互只重跑侧边栏，配置经 session_state 交给主界面
+@st.fragment
+def sidebar_config():
     st.header("🔑 API 配置（建议使用支持流式响应的api）")
     
     # API 提供商选择 - 添加DeepSeek选项
     api_provider = st.radio(
         "选择 API 提供商",
-        ["OpenAI 官方", "硅基流动 (SiliconFlow)", "DeepSeek"],
+        ["OpenAI 官方", "硅基流动 (SiliconFlow)", "DeepSeek", LOCAL_PROVIDER],
         index=0,
         help="选择要使用的 AI 模型提供商"
     )
@@ -400,43 +278,45 @@ with st.sidebar:
     # API 密钥输入 - 移动到模型选择区域上方
     if "api_key_input" not in st.session_state:
         st.session_state.api_key_input = ""
-        
-    api_key = st.text_input(
-        f"输入你的 {api_provider} API 密钥",
-        value=st.session_state.api_key_input,
-        type="password",
-        help=f"从 {api_provider} 控制台获取你的 API 密钥",
-        key="api_key_widget"  
-    )
 
-    # 更新会话状态
-    if api_key != st.session_state.api_key_input:
-        st.session_state.api_key_input = api_key
+    # 本地模型在进程内运行，不需要 API 密钥
+    if api_provider != LOCAL_PROVIDER:
+        api_key = st.text_input(
+            f"输入你的 {api_provider} API 密钥",
+            value=st.session_state.api_key_input,
+            type="password",
+            help=f"从 {api_provider} 控制台获取你的 API 密钥",
+            key="api_key_widget"  
+        )
+
+        # 更新会话状态
+        if api_key != st.session_state.api_key_input:
+            st.session_state.api_key_input = api_key
     
-    # 显示状态信息
-    if api_key:
-        st.success("API 密钥已提供! ✅")
-    else:
-        st.warning("请输入 API 密钥以继续")
+        # 显示状态信息
+        if api_key:
+            st.success("API 密钥已提供! ✅")
+        else:
+            st.warning("请输入 API 密钥以继续")
         
-        if api_provider == "OpenAI 官方":
-            st.markdown("""
-            **获取 OpenAI API 密钥:**
-            1. 访问 [OpenAI 控制台](https://platform.openai.com/)
-            2. 创建账户并生成 API 密钥
-            """)
-        elif api_provider == "硅基流动 (SiliconFlow)":
-            st.markdown("""
-            **获取硅基流动 API 密钥:**
-            1. 访问 [硅基流动官网](https://www.siliconflow.com/)
-            2. 注册账户并获取 API 密钥
-            """)
-        elif api_provider == "DeepSeek":
-            st.markdown("""
-            **获取 DeepSeek API 密钥:**
-            1. 访问 [DeepSeek 官网](https://platform.deepseek.com/)
-            2. 注册账户并获取 API 密钥
-            """)
+            if api_provider == "OpenAI 官方":
+                st.markdown("""
+                **获取 OpenAI API 密钥:**
+                1. 访问 [OpenAI 控制台](https://platform.openai.com/)
+                2. 创建账户并生成 API 密钥
+                """)
+            elif api_provider == "硅基流动 (SiliconFlow)":
+                st.markdown("""
+                **获取硅基流动 API 密钥:**
+                1. 访问 [硅基流动官网](https://www.siliconflow.com/)
+                2. 注册账户并获取 API 密钥
+                """)
+            elif api_provider == "DeepSeek":
+                st.markdown("""
+                **获取 DeepSeek API 密钥:**
+                1. 访问 [DeepSeek 官网](https://platform.deepseek.com/)
+                2. 注册账户并获取 API 密钥
+                """)
     
     # 根据选择显示模型信息
     stream_support = True  # 所有提供商都支持流式响应
@@ -462,6 +342,10 @@ with st.sidebar:
             else:
                 st.warning("请先输入API密钥")
         
+        # 其他会话已获取过的列表可直接复用
+        if not st.session_state.siliconflow_models and st.session_state.api_key_input:
+            st.session_state.siliconflow_models = model_catalog.peek("硅基流动 (SiliconFlow)", st.session_state.api_key_input)
+
         # 显示模型选择器
         if st.session_state.siliconflow_models:
             selected_model = st.selectbox(
@@ -491,6 +375,10 @@ with st.sidebar:
             else:
                 st.warning("请先输入API密钥")
         
+        # 其他会话已获取过的列表可直接复用
+        if not st.session_state.deepseek_models and st.session_state.api_key_input:
+            st.session_state.deepseek_models = model_catalog.peek("DeepSeek", st.session_state.api_key_input)
+
         # 显示模型选择器
         if st.session_state.deepseek_models:
             selected_model = st.selectbox(
@@ -506,6 +394,12 @@ with st.sidebar:
         else:
             model_name = "deepseek-chat"  # 默认模型
             st.info("点击上方按钮获取可用模型列表")
+    elif api_provider == LOCAL_PROVIDER:
+        model_name = LOCAL_MODEL
+        if local_llm_available():
+            st.info(f"在本机 CPU 上运行 {model_name}，首次对话时加载模型")
+        else:
+            st.warning("本地模型需要安装 transformers 与 torch")
     
     # 流式响应选项
     if stream_support:
@@ -517,152 +411,328 @@ with st.sidebar:
     else:
         use_stream = False
         st.info("当前提供商不支持流式响应")
+
+    # 台词检索：只发送与当前对话最相关的经典台词
+    use_example_retrieval = st.checkbox(
+        "台词检索",
+        value=True,
+        help=f"只发送与当前对话最相关的 {persona_retrieval.EXAMPLES_TOP_K} 句经典台词，减少提示 token"
+    )
+
+    # 情绪标注：本地情感模型在后台逐句打分，更新人物心情
+    use_emotion = st.checkbox(
+        "情绪标注",
+        value=EMOTION_ENABLED,
+        disabled=not EMOTION_AVAILABLE,
+        help="用本地情感模型为回复逐句打分（首次使用需下载模型）" if EMOTION_AVAILABLE else "需要安装 transformers 与 torch"
+    )
+    
+    # 对冲请求：主线路迟迟没有首个 token 时，同时请求备用线路
+    use_hedging = False
+    if use_stream:
+        with st.expander("对冲请求（降低首字延迟）"):
+            use_hedging = st.checkbox("启用对冲请求", value=False, key="use_hedging")
+            backup_provider = st.selectbox(
+                "备用提供商",
+                [p for p in BACKUP_MODELS if p != api_provider],
+                key="hedge_backup_provider"
+            )
+            backup_model = st.text_input("备用模型", value=BACKUP_MODELS[backup_provider], key=f"hedge_backup_model_{backup_provider}")
+            backup_api_key = st.text_input(f"{backup_provider} API 密钥", type="password", key=f"hedge_backup_key_{backup_provider}")
+            hedge_threshold_ms = st.slider(
+                "对冲阈值 (ms)",
+                min_value=200,
+                max_value=10000,
+                value=HEDGE_THRESHOLD_MS,
+                step=100,
+                help="建议设为主线路首 token 延迟的 p95"
+            )
+            if use_hedging and not backup_api_key:
+                st.warning("请填写备用提供商的 API 密钥")
+                use_hedging = False
     
     # 服务器状态信息
     st.markdown("---")
     st.subheader("服务器信息")
     st.write(f"IP: {os.getenv('SERVER_IP', '未知')}")
-    st.write(f"启动时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
+    st.write(f"启动时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(PROCESS_START))}")
     st.write(f"当前模型: {model_name}")
     st.write(f"流式响应: {'启用' if use_stream else '禁用'}")
     st.write(f"提供商: {api_provider}")
+    if "last_render_stats" in st.session_state:
+        render_stats = st.session_state.last_render_stats
+        st.write(f"上轮渲染: 收到 {render_stats['chunks_received']} 块 / 推送 {render_stats['frames_pushed']} 帧")
+    for hedge_agent, hedge_stats in st.session_state.get("last_hedge_stats", {}).items():
+        if not hedge_stats["hedged"]:
+            continue
+        cancelled = "，主线路已在首字前取消" if hedge_stats["primary_cancelled"] else ""
+        st.write(f"上轮对冲（{AGENT_NAMES[hedge_agent]}）: {hedge_stats['winner']} 胜出，首字 {hedge_stats['winner_ttft_ms']} ms"
+                 f"（对冲阈值 {hedge_stats['threshold_ms']} ms）{cancelled}")
+    if "last_context_stats" in st.session_state:
+        context_stats = st.session_state.last_context_stats
+        st.write(f"上轮上下文: 发送 {context_stats['sent_tokens']} tokens，裁剪 {context_stats['trimmed_tokens']} tokens（{context_stats['trimmed_messages']} 条）")
+    cache_snapshot = prompt_cache_stats.snapshot()
+    if cache_snapshot:
+        st.write("前缀缓存命中率: " + "，".join(
+            f"{AGENT_NAMES.get(agent, agent)} {stats['cached_tokens'] / stats['prompt_tokens']:.0%}"
+            for agent, stats in cache_snapshot.items()
+        ))
+    open_breakers = [name for name, state in breaker_states().items() if state != "closed"]
+    if open_breakers:
+        st.write(f"熔断中: {', '.join(open_breakers)}")
+    cancelled_count, max_saved_tokens = cancellation_summary(telemetry_buffer.records())
+    if cancelled_count:
+        saved = f"，最多节省 {max_saved_tokens} tokens（按 max_tokens 估算的上限）" if max_saved_tokens is not None else ""
+        st.write(f"已取消的请求: {cancelled_count} 次{saved}")
+    worker_stats = generation_pool.stats()
+    st.write(f"生成线程: 活跃 {worker_stats['active']}/{worker_stats['workers']}，排队 {worker_stats['queued']}/{worker_stats['queue_depth']}（拒绝 {worker_stats['rejected']}）")
+    pool_stats = client_pool.stats()
+    st.write(f"连接复用: {pool_stats['reused_connections']}/{pool_stats['requests']} 次请求（新建连接 {pool_stats['new_connections']}）")
+    
+    # 性能遥测（勾选后才生成图表与导出文件，避免每次 rerun 的开销）
+    if st.checkbox("显示性能遥测", value=False):
+        records = telemetry_buffer.records()
+        if records:
+            # pandas 只在打开遥测面板时才导入，不计入冷启动
+            import pandas as pd
+
+            telemetry_df = pd.DataFrame(records)
+            telemetry_df["time"] = pd.to_datetime(telemetry_df["ts"], unit="s")
+            telemetry_df = telemetry_df.set_index("time")
+            st.caption("首 token 延迟 / 总耗时 (ms)")
+            st.line_chart(telemetry_df[["ttft_ms", "total_ms"]])
+            st.caption("token 间隔 p50 / p95 (ms)")
+            st.line_chart(telemetry_df[["gap_p50_ms", "gap_p95_ms"]])
+            st.caption("生成速度 (tokens/s)")
+            st.line_chart(telemetry_df[["tokens_per_sec"]])
+            st.download_button(
+                "导出 JSONL",
+                data=telemetry_buffer.export_jsonl(),
+                file_name="telemetry.jsonl",
+                mime="application/jsonl",
+                use_container_width=True
+            )
+        else:
+            st.caption("暂无请求记录")
+        inference_stats = sentiment_service.stats()
+        if inference_stats["requests"]:
+            import pandas as pd
+
+            st.caption(f"情感推理批大小（平均 {inference_stats['batch_size']['mean']}）")
+            st.bar_chart(pd.Series(inference_stats["batch_size"]["buckets"]))
+            st.caption(f"情感推理排队时间 ms（平均 {inference_stats['queue_wait_ms']['mean']}）")
+            st.bar_chart(pd.Series(inference_stats["queue_wait_ms"]["buckets"]))
     
     # 重置对话按钮
     st.markdown("---")
     if st.button("🔄 重置所有对话", use_container_width=True):
+        # 停止并丢弃正在生成的回复，否则它结束后会被写入刚清空的历史
+        if st.session_state.active_reply is not None:
+            st.session_state.active_reply.cancel()
+            st.session_state.active_reply = None
+        st.session_state.last_reply_error = None
+        st.session_state.last_hedge_stats = {}
         st.session_state.conversation_history = []
         st.session_state.agent_messages = {
             "congyu": [],
             "fangnai": [],
             "mozi": [],
-            "leina": []
+            "leina": [],
+            GROUP_CHAT: []
         }
-        st.success("所有对话已重置!")
+        st.session_state.agent_summaries = {
+            agent: summarizer.new_summary_state() for agent in st.session_state.agent_messages
+        }
+        st.session_state.agent_offsets = {agent: 0 for agent in st.session_state.agent_messages}
+        st.session_state.agent_loaded = set(st.session_state.agent_messages)
+        st.session_state.agent_moods = {}
+        st.session_state.pending_moods = {}
+        get_store().clear(st.session_state.session_id)
+        reset_history_view()
+        # 历史在侧边栏片段之外，需要整页刷新
+        st.rerun()
+
+    # 主界面处理输入时读取
+    st.session_state.chat_config = {
+        "api_provider": api_provider,
+        "model_name": model_name,
+        "use_stream": use_stream,
+        "use_example_retrieval": use_example_retrieval,
+        "use_emotion": use_emotion,
+        "use_hedging": use_hedging,
+        "backup_provider": backup_provider if use_hedging else None,
+        "backup_model": backup_model if use_hedging else None,
+        "backup_api_key": backup_api_key if use_hedging else None,
+        "hedge_threshold_ms": hedge_threshold_ms if use_hedging else None,
+    }
+
+with st.sidebar:
+    sidebar_config()
+
+startup_profile.mark("侧边栏")
 
 # ...（后面的主界面代码保持不变）...
 
 # 主内容区域（保持不变）
-st.image("qlwh.jpg", use_container_width=True)
+# 预先压缩的头图变体，按内容哈希由静态文件服务提供
+st.markdown(hero_html(), unsafe_allow_html=True)
 st.markdown("""
     ### 来和可爱的女孩子们再续前缘吧！
 """)
 
-# 代理选择器（保持不变）
-st.subheader("做出你的选择")
-agent_cols = st.columns(4)
-with agent_cols[0]:
-    if st.button(f"丛雨", use_container_width=True):
-        st.session_state.current_agent = "congyu"
-with agent_cols[1]:
-    if st.button(f"朝武芳乃", use_container_width=True):
-        st.session_state.current_agent = "fangnai"
-with agent_cols[2]:
-    if st.button(f"常陆茉子", use_container_width=True):
-        st.session_state.current_agent = "mozi"
-with agent_cols[3]:
-    if st.button(f"蕾娜", use_container_width=True):
-        st.session_state.current_agent = "leina"
-
-# 显示当前专家
+# 代理选择器：点击当前人物只重跑本片段；切换人物时历史与输入框都要变化，整页刷新
+@st.fragment
+def persona_picker():
+    st.subheader("做出你的选择")
+    selected = None
+    agent_cols = st.columns(5)
+    with agent_cols[0]:
+        if st.button(f"丛雨", use_container_width=True):
+            selected = "congyu"
+    with agent_cols[1]:
+        if st.button(f"朝武芳乃", use_container_width=True):
+            selected = "fangnai"
+    with agent_cols[2]:
+        if st.button(f"常陆茉子", use_container_width=True):
+            selected = "mozi"
+    with agent_cols[3]:
+        if st.button(f"蕾娜", use_container_width=True):
+            selected = "leina"
+    with agent_cols[4]:
+        if st.button(f"👥 {GROUP_NAME}", use_container_width=True, help="一条消息同时发给所有人物；点名时只有被点名的人物回复"):
+            selected = GROUP_CHAT
+    if selected and selected != st.session_state.current_agent:
+        st.session_state.current_agent = selected
+        st.rerun()
+
+    # 显示当前专家
+    settle_moods()
+    current_mood = st.session_state.agent_moods.get(st.session_state.current_agent)
+    st.info(f"当前人物: {CHAT_NAMES[st.session_state.current_agent]}" + (f" · {current_mood[0]} {current_mood[1]}" if current_mood else ""))
+
+persona_picker()
 current_agent = st.session_state.current_agent
-st.info(f"当前人物: {AGENT_NAMES[current_agent]}")
+ensure_history_loaded(current_agent)
 
 # 对话历史区域
 st.subheader(f"对话历史")
-conversation_container = st.container()
 
-# 显示当前专家的对话历史
-with conversation_container:
-    for msg in st.session_state.agent_messages[current_agent]:
-        if msg["role"] == "system":
-            continue
-            
-        with st.chat_message(name=msg["role"]):
-            st.markdown(msg["content"])
+# 用户输入区域（固定在页面底部；先处理输入，聊天区域才能显示刚提交的回复）
+user_input = st.chat_input(f"与{CHAT_NAMES[current_agent]}对话...", key=f"chat_input_{current_agent}")
 
-# 用户输入区域
-user_input = st.chat_input(f"与{AGENT_NAMES[current_agent]}对话...", key=f"chat_input_{current_agent}")
+# 侧边栏片段保存的配置
+chat_config = st.session_state.chat_config
+api_provider = chat_config["api_provider"]
+model_name = chat_config["model_name"]
 
-# 处理用户输入
-if user_input and st.session_state.api_key_input:
+# 处理用户输入：组装好消息后交给后台工作线程生成，本次运行不等待上游
+if user_input and (st.session_state.api_key_input or api_provider == LOCAL_PROVIDER):
     client = initialize_openai_client(st.session_state.api_key_input, api_provider)
     
     if client:
+        # 上一条回复仍在生成时先停止它，已生成的部分写入历史后再追加新消息；
+        # 非流式请求无法中途中止，必须等工作线程真正结束，否则回复会被新任务覆盖而丢失
+        previous_reply = st.session_state.active_reply
+        if previous_reply is not None:
+            previous_reply.cancel()
+            if not previous_reply.wait(CANCEL_WAIT):
+                with st.spinner("等待上一条回复结束..."):
+                    previous_reply.wait()
+            commit_finished_reply()
+        st.session_state.last_reply_error = None
+        st.session_state.last_hedge_stats = {}
+
         # 添加用户消息到历史
-        st.session_state.agent_messages[current_agent].append({"role": "user", "content": user_input})
-        
-        # 在对话历史中显示用户消息
-        with conversation_container:
-            with st.chat_message("user", avatar="👤"):
-                st.markdown(user_input)
-        
-        # 准备完整的消息列表（包括系统提示）
-        messages = [
-            {"role": "system", "content": AGENT_INSTRUCTIONS[current_agent]}
-        ] + st.session_state.agent_messages[current_agent]
-        
-        # 创建占位符用于显示AI响应
-        with conversation_container:
-            ai_placeholder = st.empty()
-            with ai_placeholder.container():
-                with st.chat_message("assistant"):
-                    message_placeholder = st.empty()
+        append_message(current_agent, "user", user_input)
         
-        # 生成AI响应
+        # 准备消息列表（系统提示 + 滚动摘要 + 预算内的未摘要历史 + 检索到的台词）
+        summary_state = st.session_state.agent_summaries[current_agent]
+        history = st.session_state.agent_messages[current_agent]
         try:
-            full_response = ""
-            
-            # 流式响应处理
-            if use_stream:
-                response = run_agent(
-                    client,
-                    model_name,
-                    messages,
-                    stream=True
-                )
-                
-                if hasattr(response, '__iter__'):
-                    for chunk in response:
-                        if not chunk.choices:
-                            continue
-                        
-                        # 处理内容块
-                        if chunk.choices[0].delta.content:
-                            content = chunk.choices[0].delta.content
-                            full_response += content
-                            message_placeholder.markdown(full_response + "▌")
-            # 非流式响应处理
+            if current_agent == GROUP_CHAT:
+                # 群聊：被点名（或全部）的人物同时生成，各自以自己的视角看共享记录
+                jobs = []
+                for agent in responders(user_input):
+                    messages, context_stats = prepare_group_messages(
+                        agent,
+                        history,
+                        api_provider,
+                        model_name,
+                        summary_state=summary_state,
+                        use_example_retrieval=chat_config["use_example_retrieval"]
+                    )
+                    prompt_cache_stats.check_prefix(agent, messages)
+                    jobs.append((ReplyBuffer(agent, client, api_provider),
+                                 build_reply_job(agent, messages, client, chat_config)))
+                st.session_state.active_reply = submit_group(generation_pool, jobs)
             else:
-                response = run_agent(
-                    client,
+                messages, context_stats = prepare_messages(
+                    current_agent,
+                    history,
+                    api_provider,
                     model_name,
-                    messages,
-                    stream=False
+                    summary_state=summary_state,
+                    use_example_retrieval=chat_config["use_example_retrieval"]
+                )
+                prompt_cache_stats.check_prefix(current_agent, messages)
+                st.session_state.active_reply = generation_pool.submit(
+                    ReplyBuffer(current_agent, client, api_provider),
+                    build_reply_job(current_agent, messages, client, chat_config)
                 )
-                
-                if hasattr(response, 'choices'):
-                    full_response = response.choices[0].message.content
-                else:
-                    full_response = response
-                
-                message_placeholder.markdown(full_response)
-            
-            # 移除光标并显示完整响应
-            message_placeholder.markdown(full_response)
-            
-            # 添加AI响应到历史
-            st.session_state.agent_messages[current_agent].append({"role": "assistant", "content": full_response})
-            
-        except Exception as e:
-            logger.error(f"生成响应时出错: {str(e)}")
-            error_msg = f"⚠️ 生成响应时出错: {str(e)}"
-            message_placeholder.markdown(error_msg)
-            st.session_state.agent_messages[current_agent].append({"role": "assistant", "content": error_msg})
+            st.session_state.last_context_stats = context_stats
+        except QueueFullError as e:
+            st.session_state.last_reply_error = (current_agent, e)
     else:
         st.error("初始化 API 客户端失败，请检查 API 密钥。")
-elif user_input and not st.session_state.api_key_input:
+elif user_input:
     st.warning("请先在侧边栏输入 API 密钥!")
 
+@st.fragment(run_every=POLL_INTERVAL if st.session_state.active_reply is not None else None)
+def chat_area(agent: str):
+    """对话历史 + 正在生成的回复；生成中按 POLL_INTERVAL 单独重跑本片段，不触发整页 rerun"""
+    if commit_finished_reply():
+        # 回复已写入历史：整页刷新侧边栏统计，并停止轮询
+        st.rerun()
+
+    # 显示当前专家的对话历史（只渲染最近的窗口，更早的按页加载）
+    render_history(agent)
+
+    reply_error = st.session_state.get("last_reply_error")
+    if reply_error and reply_error[0] == agent:
+        error = reply_error[1]
+        if isinstance(error, CircuitOpenError):
+            st.warning(f"⚠️ {str(error)}，请稍后再试或切换提供商")
+        elif isinstance(error, QueueFullError):
+            st.warning(f"⚠️ {str(error)}，请稍后再试")
+        else:
+            st.error(f"⚠️ 生成响应时出错: {str(error)}")
+
+    reply = st.session_state.active_reply
+    if reply is None:
+        return
+    if reply.agent != agent:
+        st.caption(f"{CHAT_NAMES[reply.agent]} 正在回复…")
+        return
+    # 只显示节流后的文本：按时间窗口、句末或流结束刷新，而不是每次轮询都取最新全文
+    if isinstance(reply, GroupReply):
+        # 群聊：各人物的回复并排显示，结束后按发言顺序写入记录
+        for column, part in zip(st.columns(len(reply.replies)), reply.replies):
+            with column, st.chat_message("assistant", avatar=persona_avatar(part.agent)):
+                st.caption(AGENT_NAMES[part.agent] + (f" · {part.mood[0]} {part.mood[1]}" if part.mood else ""))
+                st.markdown(part.visible_text + ("" if part.done else "▌"))
+        st.button("⏹ 停止生成", key="stop_generation", on_click=reply.cancel)
+        return
+    with st.chat_message("assistant", avatar=persona_avatar(agent)):
+        if reply.mood:
+            st.caption(f"{reply.mood[0]} {AGENT_NAMES[agent]}现在的心情: {reply.mood[1]}")
+        st.markdown(reply.visible_text + "▌")
+        st.button("⏹ 停止生成", key="stop_generation", on_click=reply.cancel)
+
+with st.container():
+    chat_area(current_agent)
+
+startup_profile.mark("主界面")
+
 # 页脚（保持不变）
 st.markdown("---")
 st.markdown("""
@@ -673,3 +743,5 @@ st.markdown("""
         <p>服务器状态: 运行中 🟢 | 多轮对话支持</p>
     </div>
 """, unsafe_allow_html=True)
+
+startup_profile.finish()
@@ -0,0 +1,204 @@
+"""图片资源预处理与进程级缓存
+
+原图在启动时（或 `python assets.py` 构建时）生成缩放、重新压缩后的变体：
+- 头图：WebP，多个宽度，按内容哈希命名写入 static/，
+  由 Streamlit 静态文件服务提供，URL 带 ?v=<哈希>，浏览器可长期缓存
+- 模糊占位图：极小的 WebP，以 data URI 内联，头图加载完成前先显示
+- 人物头像：缩放后的 PNG 字节，交给 st.chat_message，媒体地址同样由内容哈希决定
+
+生成结果记录在 static/manifest.json 中，原图不变时后续进程直接复用，不再重新编码。
+"""
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+from functools import lru_cache
+
+from PIL import Image, ImageFilter, ImageOps
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Streamlit 只提供主脚本同级 static/ 目录下的文件（需开启 server.enableStaticServing）
+STATIC_DIR = os.path.join(BASE_DIR, "static")
+STATIC_URL = "app/static"
+MANIFEST_PATH = os.path.join(STATIC_DIR, "manifest.json")
+
+HERO_IMAGE = "qlwh.jpg"
+# 内容区宽度为 730px，高分屏取两倍
+HERO_WIDTHS = (730, 1460)
+HERO_SIZES = "(max-width: 730px) 100vw, 730px"
+HERO_QUALITY = 80
+PLACEHOLDER_WIDTH = 24
+
+PERSONA_AVATARS = {
+    "congyu": "congyu.png",
+}
+AVATAR_SIZE = 96
+AVATAR_COLORS = 128
+
+# 格式 -> (扩展名, MIME 类型)，按优先级排列。
+# Streamlit 静态文件服务只为少数扩展名（webp/png/jpg 等）返回正确的 Content-Type，
+# .avif 会以 text/plain + nosniff 返回而被浏览器拒绝，因此不生成 AVIF
+FORMATS = {"WEBP": ("webp", "image/webp")}
+HERO_FORMATS = list(FORMATS)
+
+# 变更这些参数后需重新生成
+PIPELINE_VERSION = f"2:{HERO_WIDTHS}:{HERO_QUALITY}:{PLACEHOLDER_WIDTH}:{HERO_FORMATS}"
+
+_lock = threading.Lock()
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _encode(image: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **params)
+    return buffer.getvalue()
+
+
+def _resize_to_width(image: Image.Image, width: int) -> Image.Image:
+    if image.width <= width:
+        return image
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _load_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _build_hero(path: str) -> dict:
+    """生成头图的各个变体，返回清单条目"""
+    with Image.open(path) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    os.makedirs(STATIC_DIR, exist_ok=True)
+
+    variants = []
+    for fmt in HERO_FORMATS:
+        ext, mime = FORMATS[fmt]
+        for width in HERO_WIDTHS:
+            data = _encode(_resize_to_width(image, width), fmt, quality=HERO_QUALITY)
+            digest = _digest(data)
+            filename = f"{stem}.{width}.{digest}.{ext}"
+            with open(os.path.join(STATIC_DIR, filename), "wb") as f:
+                f.write(data)
+            variants.append({
+                "format": fmt, "mime": mime, "width": min(width, image.width), "file": filename, "hash": digest,
+            })
+
+    small = _resize_to_width(image, PLACEHOLDER_WIDTH).filter(ImageFilter.GaussianBlur(1))
+    placeholder = base64.b64encode(_encode(small, "WEBP", quality=40)).decode("ascii")
+    return {
+        "size": list(image.size),
+        "variants": variants,
+        "placeholder": f"data:image/webp;base64,{placeholder}",
+    }
+
+
+def hero_entry(name: str = HERO_IMAGE) -> dict:
+    """头图的清单条目；原图或处理参数变化时重新生成"""
+    path = os.path.join(BASE_DIR, name)
+    with open(path, "rb") as f:
+        key = f"{name}:{_digest(f.read())}:{PIPELINE_VERSION}"
+    with _lock:
+        manifest = _load_manifest()
+        entry = manifest.get(key)
+        if entry and all(os.path.exists(os.path.join(STATIC_DIR, v["file"])) for v in entry["variants"]):
+            return entry
+        entry = _build_hero(path)
+        # 只保留当前原图的条目，旧变体文件留给部署清理
+        manifest = {k: v for k, v in manifest.items() if not k.startswith(f"{name}:")}
+        manifest[key] = entry
+        with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        return entry
+
+
+def _static_url(variant: dict) -> str:
+    # 带 v 参数时静态文件服务返回长期缓存头
+    return f"{STATIC_URL}/{variant['file']}?v={variant['hash']}"
+
+
+@lru_cache(maxsize=None)
+def hero_html(name: str = HERO_IMAGE) -> str:
+    """头图的 <picture> 片段（进程内只生成一次）"""
+    try:
+        entry = hero_entry(name)
+    except OSError as e:
+        logger.error(f"生成头图变体失败: {str(e)}")
+        return ""
+
+    width, height = entry["size"]
+    sources = []
+    for fmt in HERO_FORMATS:
+        variants = [v for v in entry["variants"] if v["format"] == fmt]
+        srcset = ", ".join(f"{_static_url(v)} {v['width']}w" for v in variants)
+        sources.append((variants, srcset))
+
+    # 最后一种格式（WebP）作为 <img> 本身，其余作为优先的 <source>
+    fallback_variants, fallback_srcset = sources[-1]
+    source_tags = "".join(
+        f'<source type="{variants[0]["mime"]}" srcset="{srcset}" sizes="{HERO_SIZES}">'
+        for variants, srcset in sources[:-1]
+    )
+    return (
+        f"<picture>{source_tags}"
+        f'<img src="{_static_url(fallback_variants[0])}" '
+        f'srcset="{fallback_srcset}" sizes="{HERO_SIZES}" '
+        f'width="{width}" height="{height}" alt="" decoding="async" fetchpriority="high" '
+        f'style="width:100%;height:auto;border-radius:0.5rem;'
+        f'background:url({entry["placeholder"]}) center/cover no-repeat">'
+        f"</picture>"
+    )
+
+
+@lru_cache(maxsize=None)
+def persona_avatar(agent: str):
+    """人物头像的 PNG 字节，没有头像时返回 None
+
+    st.chat_message 会把 WebP 重新编码为 PNG/JPEG，因此头像直接输出 PNG，
+    尺寸又在内容区上限以内，Streamlit 不会再做任何缩放或转码。
+    """
+    name = PERSONA_AVATARS.get(agent)
+    if name is None:
+        return None
+    try:
+        with Image.open(os.path.join(BASE_DIR, name)) as source:
+            image = ImageOps.fit(source.convert("RGBA"), (AVATAR_SIZE, AVATAR_SIZE), Image.LANCZOS)
+            image = image.quantize(colors=AVATAR_COLORS, method=Image.Quantize.FASTOCTREE)
+    except OSError as e:
+        logger.error(f"加载头像 {name} 失败: {str(e)}")
+        return None
+    return _encode(image, "PNG", optimize=True)
+
+
+def build_all():
+    """预先生成全部变体（部署构建步骤）"""
+    hero_html.cache_clear()
+    html = hero_html()
+    avatars = {agent: persona_avatar(agent) for agent in PERSONA_AVATARS}
+    return html, avatars
+
+
+if __name__ == "__main__":
+    build_all()
+    entry = hero_entry()
+    original = os.path.getsize(os.path.join(BASE_DIR, HERO_IMAGE))
+    print(f"{HERO_IMAGE}: 原图 {original / 1024:.0f} KB")
+    for variant in entry["variants"]:
+        size = os.path.getsize(os.path.join(STATIC_DIR, variant["file"]))
+        print(f"  {variant['file']}: {size / 1024:.0f} KB")
+    print(f"  占位图: {len(entry['placeholder'])} 字节（data URI）")
+    for agent in PERSONA_AVATARS:
+        print(f"{PERSONA_AVATARS[agent]} -> {agent} 头像: {len(persona_avatar(agent)) / 1024:.1f} KB")
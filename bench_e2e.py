@@ -0,0 +1,163 @@
+"""端到端基准：用本地模拟服务驱动 app.py 的对话路径
+
+无需 API 密钥和网络。统计：
+- rerun_ms：200 条历史时一次空闲 rerun 的耗时
+- raw_ttft_ms / raw_total_ms：直接调用 run_agent 的首 token 与总耗时（上游基线）
+- user_ttft_ms：从提交消息到首个增量写入后台回复缓冲区的耗时
+- turn_ms / render_overhead_ms：从提交消息到回复写入历史的总耗时，以及相对上游基线多出的部分
+- cpu_ms_per_token：每个流式 token 消耗的本进程 CPU 时间
+
+结果与 bench_baseline.json 比较，超过容差视为回归并以非零状态退出。
+
+用法:
+    python bench_e2e.py                    # 运行并与基线比较
+    python bench_e2e.py --update-baseline  # 运行并写入新基线
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BASE_DIR, "bench_baseline.json")
+
+# 模拟服务配置：固定参数保证结果可比
+MOCK_OPTIONS = {"ttft_ms": 100, "tokens_per_sec": 400, "reply_chars": 200, "chunk_chars": 1}
+TURNS = 5
+RERUNS = 10
+HISTORY_MESSAGES = 200
+# 相对基线的容差（耗时类指标噪声较大）
+TOLERANCE = 1.5
+# 低于该值的差异忽略（毫秒级抖动）
+ABSOLUTE_SLACK = 5.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _median(values: list) -> float:
+    return round(statistics.median(values), 2)
+
+
+def run_benchmark() -> dict:
+    port = _free_port()
+    os.environ["CIALLO_MOCK_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("CIALLO_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    # 情绪标注需要本地情感模型，不计入端到端基准
+    os.environ["CIALLO_EMOTION"] = "0"
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+
+    import mock_server
+    server = mock_server.start_subprocess(port, **MOCK_OPTIONS)
+    try:
+        return _measure()
+    finally:
+        server.terminate()
+
+
+def _measure() -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    from agent import run_agent
+    from client_pool import client_pool
+
+    results = {}
+
+    # 上游基线：直接消费流
+    client = client_pool.get("DeepSeek", "sk-bench")
+    ttfts, totals = [], []
+    for _ in range(TURNS):
+        start = time.perf_counter()
+        first = None
+        for chunk in run_agent(client, "deepseek-chat", [{"role": "user", "content": "你好"}], stream=True):
+            if first is None and chunk.choices and chunk.choices[0].delta.content:
+                first = time.perf_counter()
+        totals.append((time.perf_counter() - start) * 1000)
+        ttfts.append((first - start) * 1000)
+    results["raw_ttft_ms"] = _median(ttfts)
+    results["raw_total_ms"] = _median(totals)
+
+    at = AppTest.from_file(os.path.join(BASE_DIR, "app.py"), default_timeout=60).run()
+    at.sidebar.radio[0].set_value("DeepSeek").run()
+    at.sidebar.text_input[0].set_value("sk-bench").run()
+
+    turn_times, user_ttfts, cpu_per_token = [], [], []
+    for i in range(TURNS):
+        cpu_start = time.process_time()
+        start = time.perf_counter()
+        at.chat_input[0].set_value(f"第 {i} 句").run()
+        # 回复在后台线程生成；AppTest 不会自动重跑片段，结束后用一次整页运行写入历史
+        reply = at.session_state.active_reply
+        reply.wait(60)
+        at.run()
+        turn_times.append((time.perf_counter() - start) * 1000)
+        cpu = time.process_time() - cpu_start
+        user_ttfts.append((reply.first_delta_at - start) * 1000)
+        cpu_per_token.append(cpu * 1000 / max(reply.chunks, 1))
+    results["user_ttft_ms"] = _median(user_ttfts)
+    results["turn_ms"] = _median(turn_times)
+    results["render_overhead_ms"] = round(results["turn_ms"] - results["raw_total_ms"], 2)
+    results["cpu_ms_per_token"] = round(statistics.median(cpu_per_token), 3)
+
+    # 长历史下的空闲 rerun
+    at.session_state.agent_messages["congyu"] = [
+        {"role": "user" if n % 2 == 0 else "assistant", "content": f"历史消息 {n} " * 10}
+        for n in range(HISTORY_MESSAGES)
+    ]
+    at.run()
+    rerun_times = []
+    for _ in range(RERUNS):
+        start = time.perf_counter()
+        at.run()
+        rerun_times.append((time.perf_counter() - start) * 1000)
+    results["rerun_ms"] = _median(rerun_times)
+    return results
+
+
+def compare(results: dict, baseline: dict) -> list:
+    """返回回归的指标列表"""
+    regressions = []
+    for name, value in results.items():
+        if name.startswith("raw_") or name not in baseline:
+            continue
+        limit = max(baseline[name] * TOLERANCE, baseline[name] + ABSOLUTE_SLACK)
+        if value > limit:
+            regressions.append(f"{name}: {value} > {limit:.2f}（基线 {baseline[name]}）")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入基线")
+    args = parser.parse_args()
+
+    results = run_benchmark()
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    print(f"{'指标':<22}{'本次':>12}{'基线':>12}")
+    for name, value in results.items():
+        print(f"{name:<22}{value:>12}{baseline.get(name, '-'):>12}")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\n基线已更新: {BASELINE_PATH}")
+    else:
+        regressions = compare(results, baseline)
+        if regressions:
+            print("\n性能回归:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
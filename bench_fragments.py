@@ -0,0 +1,86 @@
+"""片段化 rerun 基准
+
+在 200 条消息的对话上（全部加载并逐条渲染），对真实的 `streamlit run` 服务测量常见交互
+触发的 rerun 耗时：空闲整页 rerun、侧边栏交互（流式开关、输入密钥、切换提供商）与切换人物。
+交互的控件位于片段（st.fragment）中时，与浏览器一样只重跑该片段。
+
+用 --app 指定其他版本的脚本可做前后对比（脚本需放在仓库目录下），例如:
+    git show <旧提交>:app.py > app_before.py
+    python bench_fragments.py --app app_before.py
+
+用法:
+    python bench_fragments.py
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+
+from load_test import Session, _free_port, start_app
+
+HISTORY_MESSAGES = 200
+REPEATS = 10
+SESSION_ID = "bench-fragments"
+PROVIDERS = ["DeepSeek", "硅基流动 (SiliconFlow)"]
+
+# (名称, 第 i 次执行的交互)
+INTERACTIONS = [
+    ("整页 rerun", lambda session, i: session.rerun()),
+    ("流式开关", lambda session, i: session.check("启用流式响应", i % 2 == 1)),
+    ("输入密钥", lambda session, i: session.type_text("text_input", f"输入你的 {PROVIDERS[0]} API 密钥", f"sk-{i}")),
+    ("切换提供商", lambda session, i: session.choose("radio", "选择 API 提供商", PROVIDERS[(i + 1) % 2])),
+    ("切换人物", lambda session, i: session.click(["朝武芳乃", "丛雨"][i % 2])),
+]
+
+
+def seed_history(db_path: str):
+    """写入 HISTORY_MESSAGES 条丛雨的历史消息"""
+    os.environ["CIALLO_DB_PATH"] = db_path
+    from conversation_store import get_store
+
+    store = get_store()
+    for n in range(HISTORY_MESSAGES):
+        store.append(SESSION_ID, "congyu", n, "user" if n % 2 == 0 else "assistant", f"历史消息 {n} " * 10)
+    store.flush()
+
+
+async def measure(script: str) -> dict:
+    db_path = os.path.join(tempfile.mkdtemp(), "fragments.db")
+    seed_history(db_path)
+    port = _free_port()
+    env = dict(
+        os.environ,
+        CIALLO_DB_PATH=db_path,
+        # 整段历史一次加载进内存并逐条渲染
+        CIALLO_DB_PAGE_SIZE=str(HISTORY_MESSAGES),
+        CIALLO_RENDER_WINDOW=str(HISTORY_MESSAGES),
+        CIALLO_EMOTION="0",
+    )
+    app = start_app(port, env, script)
+    session = Session(port)
+    session.query_string = f"sid={SESSION_ID}"
+    results = {}
+    try:
+        await session.connect()
+        await session.choose("radio", "选择 API 提供商", PROVIDERS[0])
+        for name, interact in INTERACTIONS:
+            await interact(session, 0)  # 预热
+            samples = [await interact(session, i + 1) * 1000 for i in range(REPEATS)]
+            results[name] = statistics.median(samples)
+        if session.exceptions:
+            raise RuntimeError(f"脚本执行出错: {session.exceptions[0]}")
+    finally:
+        session.close()
+        app.terminate()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default="app.py", help="要测量的脚本（相对仓库目录）")
+    args = parser.parse_args()
+    results = asyncio.run(measure(args.app))
+    print(f"{args.app}（{HISTORY_MESSAGES} 条历史，中位数）")
+    for name, ms in results.items():
+        print(f"{name:<10}{ms:>10.1f} ms")
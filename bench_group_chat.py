@@ -0,0 +1,92 @@
+"""群聊并行生成基准：用本地模拟服务驱动 app.py
+
+先依次与四个人物单聊各一轮，再在群聊中发一条消息让四人同时回复，比较：
+- 单聊逐个回复的总耗时（四轮之和）与其中最慢的一轮
+- 群聊一轮的总耗时（从提交到四条回复都写入记录）
+群聊耗时应接近最慢的单条回复，而不是四条之和。
+
+用法:
+    python bench_group_chat.py
+    python bench_group_chat.py --rounds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from bench_e2e import BASE_DIR, MOCK_OPTIONS, _free_port
+from personas import AGENT_NAMES
+
+
+def run_turn(at, text: str) -> float:
+    """提交一条消息并等待回复写入历史，返回耗时 ms"""
+    start = time.perf_counter()
+    at.chat_input[0].set_value(text).run()
+    reply = at.session_state.active_reply
+    reply.wait(60)
+    # AppTest 不会自动重跑片段，结束后用一次整页运行写入历史
+    at.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    if "last_reply_error" in at.session_state and at.session_state.last_reply_error:
+        raise RuntimeError(f"回复出错: {at.session_state.last_reply_error[1]}")
+    return elapsed
+
+
+def select(at, label: str):
+    next(button for button in at.button if button.label == label).click().run()
+
+
+def measure(rounds: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(BASE_DIR, "app.py"), default_timeout=60).run()
+    at.sidebar.radio[0].set_value("DeepSeek").run()
+    at.sidebar.text_input[0].set_value("sk-bench").run()
+    labels = {button.label: button for button in at.button}
+    persona_labels = [next(label for label in labels if name in label) for name in AGENT_NAMES.values()]
+    group_label = next(label for label in labels if "群聊" in label)
+
+    sums, slowest, groups = [], [], []
+    for i in range(rounds):
+        singles = []
+        for label in persona_labels:
+            select(at, label)
+            singles.append(run_turn(at, f"第 {i} 句"))
+        select(at, group_label)
+        groups.append(run_turn(at, f"大家好，第 {i} 句"))
+        sums.append(sum(singles))
+        slowest.append(max(singles))
+    speakers = [msg.get("speaker") for msg in at.session_state.agent_messages["group"][-len(AGENT_NAMES):]]
+    return {
+        "single_sum_ms": statistics.median(sums),
+        "single_max_ms": statistics.median(slowest),
+        "group_ms": statistics.median(groups),
+        "last_order": [AGENT_NAMES[speaker] for speaker in speakers],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3, help="重复轮数（取中位数）")
+    args = parser.parse_args()
+
+    port = _free_port()
+    os.environ["CIALLO_MOCK_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    os.environ.setdefault("CIALLO_DB_PATH", os.path.join(tempfile.mkdtemp(), "bench.db"))
+    os.environ.setdefault("CIALLO_EMOTION", "0")
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+
+    import mock_server
+    server = mock_server.start_subprocess(port, **MOCK_OPTIONS)
+    try:
+        results = measure(args.rounds)
+    finally:
+        server.terminate()
+    print(f"单聊逐个回复（{len(AGENT_NAMES)} 人）总耗时 {results['single_sum_ms']:>8.1f} ms")
+    print(f"其中最慢的一轮                {results['single_max_ms']:>8.1f} ms")
+    print(f"群聊并行回复总耗时            {results['group_ms']:>8.1f} ms"
+          f"（最慢单条的 {results['group_ms'] / results['single_max_ms']:.2f} 倍）")
+    print(f"最后一轮发言顺序: {' → '.join(results['last_order'])}")
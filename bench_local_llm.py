@@ -0,0 +1,71 @@
+"""本地模型前缀复用基准
+
+对每个人物，用不同长度的对话历史组装本轮提示（与 app.py 相同的 prepare_messages），
+分别测量复用系统提示 KV cache 与完整预填充时的预填充耗时（首个 token 之前的计算）。
+复用一侧包含复制前缀 cache 的开销。
+
+用法:
+    python bench_local_llm.py
+    python bench_local_llm.py --turns 0,4,16 --repeats 5
+"""
+import argparse
+import statistics
+import sys
+import time
+
+from agent import prepare_messages
+from local_llm import LOCAL_MODEL, LOCAL_PROVIDER, load_engine, local_llm_available
+from personas import AGENT_NAMES
+
+# 合成对话：用户与人物交替
+SAMPLE_TURNS = [
+    ("user", "今天练刀练得好累，想休息一下。"),
+    ("assistant", "辛苦啦，先坐下来喝口茶吧，本座陪着你。"),
+    ("user", "晚上一起去看祭典的烟花好不好？"),
+    ("assistant", "好呀好呀！不过要早点去占个好位置哦。"),
+]
+
+
+def build_history(turns: int) -> list:
+    pairs = (SAMPLE_TURNS * (turns // 2 + 1))[:turns * 2]
+    return [{"role": role, "content": content} for role, content in pairs] + [
+        {"role": "user", "content": "你还记得我们刚才聊了什么吗？"}
+    ]
+
+
+def time_prefill(engine, messages: list, reuse_prefix: bool) -> tuple:
+    """返回 (耗时 ms, 实际预填充的 token 数)"""
+    start = time.perf_counter()
+    cache, input_ids, _ = engine.prepare(messages, reuse_prefix=reuse_prefix)
+    with engine.lock:
+        engine.prefill(cache, input_ids)
+    return (time.perf_counter() - start) * 1000, len(input_ids)
+
+
+def main(turns_list: list, repeats: int):
+    engine = load_engine(LOCAL_MODEL)
+    print(f"模型: {LOCAL_MODEL}")
+    print(f"{'人物':<8}{'轮数':>6}{'提示tokens':>12}{'复用tokens':>12}{'完整ms':>10}{'复用ms':>10}{'加速':>8}")
+    for agent, name in AGENT_NAMES.items():
+        for turns in turns_list:
+            messages, _ = prepare_messages(agent, build_history(turns), LOCAL_PROVIDER, LOCAL_MODEL)
+            results = {}
+            for reuse_prefix in (False, True):
+                time_prefill(engine, messages, reuse_prefix)  # 预热
+                samples = [time_prefill(engine, messages, reuse_prefix) for _ in range(repeats)]
+                results[reuse_prefix] = (statistics.median(ms for ms, _ in samples), samples[0][1])
+            full_ms, full_tokens = results[False]
+            reuse_ms, reuse_tokens = results[True]
+            print(f"{name:<8}{turns:>6}{full_tokens:>12}{full_tokens - reuse_tokens:>12}"
+                  f"{full_ms:>10.1f}{reuse_ms:>10.1f}{full_ms / reuse_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", default="0,4,16", help="逗号分隔的历史轮数")
+    parser.add_argument("--repeats", type=int, default=5, help="每项重复次数（取中位数）")
+    args = parser.parse_args()
+    if not local_llm_available():
+        print("本地模型需要安装 transformers 与 torch")
+        sys.exit(1)
+    main([int(n) for n in args.turns.split(",")], args.repeats)
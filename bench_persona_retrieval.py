@@ -0,0 +1,46 @@
+"""台词检索基准：对比发送全部台词与只发送 top-k 台词的提示 token 数和耗时
+
+用法: python bench_persona_retrieval.py
+"""
+import time
+
+from context_window import count_text_tokens
+from personas import AGENT_INSTRUCTIONS, AGENT_NAMES, PERSONA_CORE, PERSONA_EXAMPLES
+import persona_retrieval
+
+QUERIES = [
+    "今天想吃什么？",
+    "你怕鬼吗？",
+    "我们去神社看看吧",
+    "你喜欢我吗？",
+    "帮我剪头发好不好",
+    "玄十郎又来了",
+]
+ROUNDS = 200
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    indexes = {agent: persona_retrieval.ExampleIndex(lines) for agent, lines in PERSONA_EXAMPLES.items()}
+    print(f"建立索引: {(time.perf_counter() - start) * 1000:.2f} ms")
+    print()
+    print(f"{'人物':<6}{'台词数':>6}{'全量 tokens':>12}{'检索 tokens':>12}{'压缩比':>8}{'检索耗时(ms)':>14}")
+    for agent in PERSONA_EXAMPLES:
+        full_tokens = count_text_tokens(AGENT_INSTRUCTIONS[agent])
+        if not persona_retrieval.needs_retrieval(agent):
+            print(f"{AGENT_NAMES[agent]:<6}{len(PERSONA_EXAMPLES[agent]):>6}{full_tokens:>12}{'（台词较少，整体发送）':>12}")
+            continue
+        retrieved_tokens = []
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            for query in QUERIES:
+                history = [{"role": "user", "content": query}]
+                message = persona_retrieval.examples_message(agent, history)
+        elapsed = (time.perf_counter() - start) * 1000 / (ROUNDS * len(QUERIES))
+        for query in QUERIES:
+            message = persona_retrieval.examples_message(agent, [{"role": "user", "content": query}])
+            retrieved_tokens.append(count_text_tokens(PERSONA_CORE[agent]) + count_text_tokens(message["content"]))
+        average = sum(retrieved_tokens) / len(retrieved_tokens)
+        print(
+            f"{AGENT_NAMES[agent]:<6}{len(PERSONA_EXAMPLES[agent]):>6}{full_tokens:>12}"
+            f"{average:>12.0f}{full_tokens / average:>8.2f}{elapsed:>14.3f}"
+        )
@@ -0,0 +1,93 @@
+"""情感模型后端基准
+
+对每个后端（torch fp32 / int8 / onnx）和线程数，在独立子进程中加载模型，
+按不同批大小测量单批延迟、吞吐（句/秒）与加载后的常驻内存。
+
+用法:
+    python bench_sentiment.py
+    python bench_sentiment.py --backends torch,int8 --threads 1,4 --batch-sizes 1,8,32
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from check_sentiment_parity import PARITY_SENTENCES
+from inference_service import _onnx_available
+
+REPEATS = 20
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_worker(backend: str, threads: int, batch_sizes: list) -> dict:
+    """子进程中执行：加载一个后端并逐个批大小计时"""
+    from inference_service import load_sentiment_runner
+
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    runner = load_sentiment_runner(backend, threads)
+    load_s = time.perf_counter() - start
+    result = {"backend": backend, "threads": threads, "load_s": round(load_s, 2),
+              "rss_mb": round(rss_mb() - rss_before, 1), "batches": {}}
+    for batch_size in batch_sizes:
+        texts = (PARITY_SENTENCES * (batch_size // len(PARITY_SENTENCES) + 1))[:batch_size]
+        runner(texts)  # 预热
+        latencies = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            runner(texts)
+            latencies.append((time.perf_counter() - start) * 1000)
+        median = statistics.median(latencies)
+        result["batches"][batch_size] = {
+            "latency_ms": round(median, 1),
+            "sentences_per_sec": round(batch_size * 1000 / median, 1),
+        }
+    return result
+
+
+def main(backends: list, threads_list: list, batch_sizes: list):
+    print(f"{'后端':<8}{'线程':>4}{'加载s':>8}{'内存MB':>9}{'批大小':>8}{'延迟ms':>10}{'句/秒':>10}")
+    for backend in backends:
+        if backend == "onnx" and not _onnx_available():
+            print("onnx    未安装 onnxruntime，跳过")
+            continue
+        for threads in threads_list:
+            process = subprocess.run(
+                [sys.executable, __file__, "--worker", backend, str(threads),
+                 ",".join(map(str, batch_sizes))],
+                capture_output=True, text=True,
+            )
+            if process.returncode != 0:
+                print(f"{backend:<8}{threads:>4}  失败: {process.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(process.stdout.strip().splitlines()[-1])
+            for batch_size, numbers in result["batches"].items():
+                print(f"{backend:<8}{threads:>4}{result['load_s']:>8}{result['rss_mb']:>9}"
+                      f"{batch_size:>8}{numbers['latency_ms']:>10}{numbers['sentences_per_sec']:>10}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--worker":
+        sizes = [int(n) for n in sys.argv[4].split(",")]
+        print(json.dumps(run_worker(sys.argv[2], int(sys.argv[3]), sizes)))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", default="torch,int8,onnx", help="逗号分隔的后端")
+    parser.add_argument("--threads", default="1,2,4", help="逗号分隔的线程数")
+    parser.add_argument("--batch-sizes", default="1,8,32", help="逗号分隔的批大小")
+    args = parser.parse_args()
+    main(
+        args.backends.split(","),
+        [int(n) for n in args.threads.split(",")],
+        [int(n) for n in args.batch_sizes.split(",")],
+    )
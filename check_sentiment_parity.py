@@ -0,0 +1,94 @@
+"""情感模型后端一致性检查
+
+用固定的中文句子集，把各后端（torch / int8 / onnx）的结果与 huggingface.py 中
+fp32 的 transformers pipeline 对比：标签必须一致，正面概率的差异不超过容差。
+任一后端不一致时以非零状态退出。
+
+用法:
+    python check_sentiment_parity.py               # 检查全部可用后端
+    python check_sentiment_parity.py --backend int8
+"""
+import argparse
+import sys
+
+from inference_service import SENTIMENT_BACKENDS, SENTIMENT_MODEL, _onnx_available, load_sentiment_runner
+
+# 固定句子集：日常对话、人物台词风格、明显正面 / 负面与中性语句
+PARITY_SENTENCES = [
+    "我喜欢你",
+    "今天天气真好，我们去散步吧！",
+    "哼，本座才不是小孩子呢！",
+    "狗修金，今天也要好好练刀哦。",
+    "供奉仪式就快到了，本座会一直看着你的。",
+    "这家店的菜太难吃了，再也不来了。",
+    "我好难过，谁都不理我。",
+    "谢谢你一直陪在我身边。",
+    "你怎么又迟到了，真让人生气。",
+    "明天早上八点开会。",
+    "这个结局让我哭了整整一晚。",
+    "太棒了，终于考上了！",
+    "我一点也不想见到他。",
+    "还行吧，没什么特别的。",
+    "有点累，但是很开心。",
+    "别碰我的东西！",
+    "和大家一起吃饭的时候最幸福了。",
+    "作业好多，根本写不完。",
+    "你做的便当真好吃。",
+    "我害怕一个人待在黑暗里。",
+    "嗯，就按你说的办吧。",
+    "这次的失败让我很失望。",
+    "春天的樱花开得真美。",
+    "你再这样我就不理你了。",
+]
+
+# 正面概率允许的最大差异
+TOLERANCES = {"torch": 1e-4, "int8": 0.05, "onnx": 1e-3}
+
+
+def positive_probability(result: dict) -> float:
+    positive = result["label"].lower().startswith("pos")
+    return result["score"] if positive else 1 - result["score"]
+
+
+def reference_results() -> list:
+    """fp32 pipeline 的结果（与 huggingface.py 相同的调用方式）"""
+    from transformers import pipeline
+
+    sentiment_analysis = pipeline("sentiment-analysis", model=SENTIMENT_MODEL)
+    return sentiment_analysis(PARITY_SENTENCES)
+
+
+def check_backend(backend: str, reference: list) -> list:
+    """返回不一致的描述列表"""
+    results = load_sentiment_runner(backend)(PARITY_SENTENCES)
+    problems = []
+    worst = 0.0
+    for sentence, expected, actual in zip(PARITY_SENTENCES, reference, results):
+        diff = abs(positive_probability(expected) - positive_probability(actual))
+        worst = max(worst, diff)
+        if expected["label"] != actual["label"]:
+            problems.append(f"{sentence}: 标签 {actual['label']} != {expected['label']}")
+        elif diff > TOLERANCES[backend]:
+            problems.append(f"{sentence}: 概率差 {diff:.4f} > {TOLERANCES[backend]}")
+    print(f"{backend:<6} 最大概率差 {worst:.5f}，不一致 {len(problems)} 句")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=list(SENTIMENT_BACKENDS), help="只检查一个后端")
+    args = parser.parse_args()
+
+    backends = [args.backend] if args.backend else list(SENTIMENT_BACKENDS)
+    if "onnx" in backends and not _onnx_available():
+        print("未安装 onnxruntime，跳过 onnx 后端")
+        backends.remove("onnx")
+
+    reference = reference_results()
+    failed = False
+    for backend in backends:
+        problems = check_backend(backend, reference)
+        for line in problems:
+            print(f"  {line}")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,62 @@
+"""冷启动预算检查
+
+启动真实的 `streamlit run app.py`，测量：
+- cold_start_s：从启动进程到健康检查通过
+- first_rerun_s：第一个会话的首次 rerun（包含 app.py 依赖的首次导入）
+- warm_rerun_s：第二个会话的首次 rerun（模块已加载）
+
+图片变体视为部署构建产物，测量前先执行与 `python assets.py` 相同的构建。
+任一项超出预算时以非零状态退出，可直接放进 CI。
+
+用法:
+    python check_startup.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+import assets
+from load_test import Session, _free_port, start_app
+
+# 预算（秒），在单核容器上留有约一倍余量
+BUDGETS = {
+    "cold_start_s": 2.0,
+    "first_rerun_s": 0.6,
+    "warm_rerun_s": 0.2,
+}
+
+
+async def measure() -> dict:
+    assets.build_all()
+    port = _free_port()
+    env = dict(os.environ, CIALLO_DB_PATH=os.path.join(tempfile.mkdtemp(), "startup.db"))
+    start = time.perf_counter()
+    app = start_app(port, env)
+    results = {"cold_start_s": time.perf_counter() - start}
+    sessions = [Session(port), Session(port)]
+    try:
+        results["first_rerun_s"] = await sessions[0].connect()
+        results["warm_rerun_s"] = await sessions[1].connect()
+        errors = sessions[0].exceptions + sessions[1].exceptions
+        if errors:
+            raise RuntimeError(f"脚本执行出错: {errors[0]}")
+    finally:
+        for session in sessions:
+            session.close()
+        app.terminate()
+    return results
+
+
+if __name__ == "__main__":
+    results = asyncio.run(measure())
+    over = []
+    print(f"{'指标':<16}{'本次':>10}{'预算':>10}")
+    for name, value in results.items():
+        print(f"{name:<16}{value:>10.3f}{BUDGETS[name]:>10.3f}")
+        if value > BUDGETS[name]:
+            over.append(name)
+    if over:
+        print(f"\n超出冷启动预算: {', '.join(over)}")
+        sys.exit(1)
@@ -0,0 +1,195 @@
+"""进程级 OpenAI 客户端连接池
+
+Streamlit 每次 rerun 都会重新执行 app.py，但被导入的模块只会加载一次，
+因此这里的注册表在所有会话、所有 rerun 之间共享，HTTP 连接得以复用。
+
+openai / httpx 导入较慢，推迟到第一次创建客户端时再导入，不拖慢冷启动。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 各提供商的 API 地址
+PROVIDER_BASE_URLS = {
+    "OpenAI 官方": "https://api.openai.com/v1",
+    "硅基流动 (SiliconFlow)": "https://api.siliconflow.cn/v1",
+    "DeepSeek": "https://api.deepseek.com/v1",
+}
+
+# 设置后所有提供商都指向该地址（本地模拟服务 / 基准测试用）
+MOCK_BASE_URL = os.getenv("CIALLO_MOCK_BASE_URL")
+
+# 连接池配置（可通过环境变量调整）
+POOL_MAX_CONNECTIONS = int(os.getenv("CIALLO_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("CIALLO_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("CIALLO_POOL_KEEPALIVE_EXPIRY", "120"))
+CLIENT_IDLE_TTL = float(os.getenv("CIALLO_CLIENT_IDLE_TTL", "900"))
+ENABLE_HTTP2 = os.getenv("CIALLO_HTTP2", "0") == "1"
+
+
+def hash_api_key(api_key: str) -> str:
+    """计算 API 密钥摘要，避免明文密钥出现在缓存键中"""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def provider_base_url(api_provider: str) -> str:
+    """提供商的 API 地址"""
+    return MOCK_BASE_URL or PROVIDER_BASE_URLS[api_provider]
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要额外安装 h2"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class _ConnectionStats:
+    """通过 httpcore 的 trace 回调统计请求数与新建连接数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tcp_connects = 0
+        self.tls_handshakes = 0
+
+    def on_request(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def on_request_async(self, request):
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace_async
+
+    def _trace(self, event_name: str, info: dict):
+        # 只有新建连接时才会触发 connect_tcp / start_tls 事件
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.tcp_connects += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    async def _trace_async(self, event_name: str, info: dict):
+        self._trace(event_name, info)
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.tcp_connects, 0)
+
+
+class _PoolEntry:
+    def __init__(self, client, http_client, stats: _ConnectionStats):
+        self.client = client
+        self.http_client = http_client
+        self.stats = stats
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.hits = 0
+
+
+class ClientPool:
+    """按 (提供商, base_url, 密钥摘要) 缓存 OpenAI 客户端
+
+    asynchronous=True 时缓存 AsyncOpenAI，供 asyncio 服务使用。
+    """
+
+    def __init__(self, idle_ttl: float = CLIENT_IDLE_TTL, asynchronous: bool = False):
+        self.idle_ttl = idle_ttl
+        self.asynchronous = asynchronous
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, api_provider: str, api_key: str):
+        """获取（或创建）共享客户端"""
+        base_url = provider_base_url(api_provider)
+        key = (api_provider, base_url, hash_api_key(api_key))
+        self.evict_idle()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._create_entry(api_key, base_url)
+                self._entries[key] = entry
+            entry.hits += 1
+            entry.last_used = time.time()
+            return entry.client
+
+    def _create_entry(self, api_key: str, base_url: str) -> _PoolEntry:
+        import httpx
+        from openai import AsyncOpenAI, OpenAI
+
+        http2 = ENABLE_HTTP2 and _http2_available()
+        if ENABLE_HTTP2 and not http2:
+            logger.warning("未安装 h2，HTTP/2 已回退为 HTTP/1.1")
+        stats = _ConnectionStats()
+        options = dict(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        # SDK 自带的重试关闭，统一由 resilience 处理
+        if self.asynchronous:
+            http_client = httpx.AsyncClient(event_hooks={"request": [stats.on_request_async]}, **options)
+            client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        else:
+            http_client = httpx.Client(event_hooks={"request": [stats.on_request]}, **options)
+            client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        return _PoolEntry(client, http_client, stats)
+
+    def evict_idle(self):
+        """关闭长时间未使用的客户端"""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, e in self._entries.items() if now - e.last_used > self.idle_ttl]
+            evicted = [self._entries.pop(k) for k in expired]
+        for entry in evicted:
+            self._close(entry)
+
+    def _close(self, entry: _PoolEntry):
+        try:
+            if self.asynchronous:
+                # 异步客户端只能在事件循环中关闭
+                asyncio.get_running_loop().create_task(entry.http_client.aclose())
+            else:
+                entry.http_client.close()
+        except Exception as e:
+            logger.error(f"关闭空闲客户端失败: {str(e)}")
+
+    def close_all(self):
+        """关闭所有客户端"""
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def stats(self) -> dict:
+        """汇总连接复用情况"""
+        with self._lock:
+            entries = list(self._entries.values())
+        return {
+            "clients": len(entries),
+            "client_hits": sum(e.hits for e in entries),
+            "requests": sum(e.stats.requests for e in entries),
+            "new_connections": sum(e.stats.tcp_connects for e in entries),
+            "tls_handshakes": sum(e.stats.tls_handshakes for e in entries),
+            "reused_connections": sum(e.stats.reused for e in entries),
+        }
+
+
+# 进程级单例
+client_pool = ClientPool()
+async_client_pool = ClientPool(asynchronous=True)
@@ -0,0 +1,103 @@
+"""按 token 预算裁剪对话历史
+
+每轮请求的历史会随对话增长，这里估算每条消息的 token 数（按内容缓存），
+在为回复预留 max_tokens 之后，把历史装入预算内，从最早的轮次开始丢弃。
+"""
+import functools
+import os
+import re
+
+# 各模型的上下文长度（token）
+CONTEXT_LIMITS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+    "deepseek-chat": 65536,
+    "deepseek-reasoner": 65536,
+    "deepseek-ai/DeepSeek-V3": 65536,
+    "deepseek-ai/DeepSeek-R1": 65536,
+}
+
+# 未知模型时按提供商取默认值
+PROVIDER_CONTEXT_LIMITS = {
+    "OpenAI 官方": 16385,
+    "硅基流动 (SiliconFlow)": 32768,
+    "DeepSeek": 65536,
+    # 本地模型在 CPU 上预填充，上下文越长首字越慢
+    "本地模型": 4096,
+}
+DEFAULT_CONTEXT_LIMIT = 8192
+
+# 历史部分的额外上限，控制每轮的提示成本
+HISTORY_BUDGET = int(os.getenv("CIALLO_HISTORY_BUDGET", "6000"))
+
+# 每条消息的格式开销
+MESSAGE_OVERHEAD = 4
+
+# 裁剪时按整块丢弃，使历史开头在若干轮内保持不变，便于提供商前缀缓存命中
+TRIM_BLOCK = int(os.getenv("CIALLO_TRIM_BLOCK", "8"))
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+@functools.lru_cache(maxsize=8192)
+def count_text_tokens(text: str) -> int:
+    """粗略估算 token 数：中日文字符约 1 个/字，其余约 4 字符/个"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def count_message_tokens(message: dict) -> int:
+    """单条消息的 token 数（按内容缓存）"""
+    return count_text_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def get_context_limit(api_provider: str, model: str) -> int:
+    """获取模型上下文长度"""
+    if model in CONTEXT_LIMITS:
+        return CONTEXT_LIMITS[model]
+    return PROVIDER_CONTEXT_LIMITS.get(api_provider, DEFAULT_CONTEXT_LIMIT)
+
+
+def build_context(system_prompt: str, history: list, api_provider: str, model: str,
+                  max_tokens: int = 1024, history_budget: int = HISTORY_BUDGET,
+                  summary: dict = None):
+    """组装本轮发送的消息列表，返回 (messages, stats)
+
+    summary 为可选的滚动摘要消息，紧跟在系统提示之后。
+    """
+    system_messages = [{"role": "system", "content": system_prompt}]
+    if summary:
+        system_messages.append(summary)
+    system_tokens = sum(count_message_tokens(m) for m in system_messages)
+    budget = get_context_limit(api_provider, model) - max_tokens - system_tokens
+    budget = max(min(budget, history_budget), 0)
+
+    # 从最新的消息往前装，找到能装下的最早位置
+    start = len(history)
+    used = 0
+    while start > 0:
+        tokens = count_message_tokens(history[start - 1])
+        if start < len(history) and used + tokens > budget:
+            break
+        start -= 1
+        used += tokens
+
+    # 起点按块对齐（对齐后至少保留一半预算的历史），并保持以用户消息开头，避免残缺的轮次
+    if start > 0 and TRIM_BLOCK > 1:
+        aligned = min(-(-start // TRIM_BLOCK) * TRIM_BLOCK, len(history) - 1)
+        if sum(count_message_tokens(m) for m in history[aligned:]) * 2 >= budget:
+            start = aligned
+    while start < len(history) - 1 and history[start]["role"] != "user":
+        start += 1
+
+    kept = history[start:]
+    trimmed = history[:start]
+    used = sum(count_message_tokens(m) for m in kept)
+    stats = {
+        "sent_tokens": system_tokens + used,
+        "trimmed_tokens": sum(count_message_tokens(m) for m in trimmed),
+        "trimmed_messages": len(trimmed),
+        "budget": budget,
+    }
+    return system_messages + kept, stats
@@ -0,0 +1,177 @@
+"""SQLite 对话存储（peewee）
+
+消息按 (会话, 人物, 序号) 保存。写入先进入队列，由后台线程批量插入，
+不占用界面渲染路径；重连时按页从数据库加载历史。
+多个标签页共用同一会话时序号可能冲突，冲突的消息顺延到末尾，不覆盖已有消息。
+群聊中的发言人物记录在 role 列中（"assistant:congyu"），加载时还原为 speaker 字段。
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from peewee import CharField, DoubleField, IntegerField, IntegrityError, Model, SqliteDatabase, TextField, fn
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.getenv("CIALLO_DB_PATH", "ciallo.db")
+# 批量写入的条数上限与最长等待时间
+WRITE_BATCH_SIZE = int(os.getenv("CIALLO_DB_BATCH_SIZE", "64"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("CIALLO_DB_FLUSH_INTERVAL", "0.5"))
+# 每页加载的消息数
+PAGE_SIZE = int(os.getenv("CIALLO_DB_PAGE_SIZE", "50"))
+
+database = SqliteDatabase(None)
+
+
+class StoredMessage(Model):
+    session_id = CharField()
+    persona = CharField()
+    seq = IntegerField()
+    role = CharField()
+    content = TextField()
+    created_at = DoubleField(default=time.time)
+
+    class Meta:
+        database = database
+        table_name = "messages"
+        indexes = ((("session_id", "persona", "seq"), True),)
+
+
+class ConversationStore:
+    """带后台批量写入的对话存储"""
+
+    def __init__(self, path: str = DB_PATH):
+        database.init(path, pragmas={"journal_mode": "wal", "synchronous": "normal"})
+        with database.connection_context():
+            database.create_tables([StoredMessage])
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+        self._worker.start()
+        atexit.register(self.flush)
+
+    def append(self, session_id: str, persona: str, seq: int, role: str, content: str, speaker: str = None):
+        """追加一条消息（异步写入）"""
+        self._queue.put(("insert", {
+            "session_id": session_id,
+            "persona": persona,
+            "seq": seq,
+            "role": f"{role}:{speaker}" if speaker else role,
+            "content": content,
+            "created_at": time.time(),
+        }))
+
+    def clear(self, session_id: str):
+        """清空会话的全部消息（与写入按顺序执行）"""
+        self._queue.put(("clear", session_id))
+
+    def flush(self, timeout: float = 5.0):
+        """等待队列中的写入完成"""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        done.wait(timeout)
+
+    def load_page(self, session_id: str, persona: str, before_seq: int = None, limit: int = PAGE_SIZE):
+        """加载 before_seq 之前的最近一页，返回 (first_seq, messages)，按时间顺序排列"""
+        with database.connection_context():
+            query = StoredMessage.select().where(
+                (StoredMessage.session_id == session_id) & (StoredMessage.persona == persona)
+            )
+            if before_seq is not None:
+                query = query.where(StoredMessage.seq < before_seq)
+            rows = list(query.order_by(StoredMessage.seq.desc()).limit(limit))
+        rows.reverse()
+        first_seq = rows[0].seq if rows else (before_seq or 0)
+        return first_seq, [_message(row) for row in rows]
+
+    def next_seq(self, session_id: str, persona: str) -> int:
+        """下一条消息的序号"""
+        with database.connection_context():
+            return _next_seq(session_id, persona)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+            while len(batch) < WRITE_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"写入对话存储失败: {str(e)}")
+
+    def _write(self, batch: list):
+        rows = []
+        with database.connection_context():
+            for op, payload in batch:
+                if op == "insert":
+                    rows.append(payload)
+                    continue
+                # 其他操作前先写入已积累的消息，保持顺序
+                self._insert(rows)
+                rows = []
+                if op == "clear":
+                    StoredMessage.delete().where(StoredMessage.session_id == payload).execute()
+                elif op == "flush":
+                    payload.set()
+            self._insert(rows)
+
+    def _insert(self, rows: list):
+        if not rows:
+            return
+        try:
+            with database.atomic():
+                StoredMessage.insert_many(rows).execute()
+        except IntegrityError:
+            # 同一会话在多个标签页中同时写入时序号会冲突：逐条插入，冲突的消息改用下一个空闲序号，
+            # 不覆盖已有消息
+            with database.atomic():
+                for row in rows:
+                    self._insert_one(row)
+
+    def _insert_one(self, row: dict):
+        try:
+            with database.atomic():
+                StoredMessage.insert(row).execute()
+            return
+        except IntegrityError:
+            pass
+        seq = _next_seq(row["session_id"], row["persona"])
+        logger.warning(f"消息序号冲突（{row['session_id']}/{row['persona']} #{row['seq']}），改存为 #{seq}")
+        StoredMessage.insert({**row, "seq": seq}).execute()
+
+
+def _next_seq(session_id: str, persona: str) -> int:
+    last = StoredMessage.select(fn.MAX(StoredMessage.seq)).where(
+        (StoredMessage.session_id == session_id) & (StoredMessage.persona == persona)
+    ).scalar()
+    return 0 if last is None else last + 1
+
+
+def _message(row: StoredMessage) -> dict:
+    role, _, speaker = row.role.partition(":")
+    message = {"role": role, "content": row.content}
+    if speaker:
+        message["speaker"] = speaker
+    return message
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ConversationStore:
+    """进程级单例（首次使用时创建）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
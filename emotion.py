@@ -0,0 +1,173 @@
+"""回复的逐句情绪标注
+
+流式回复每凑齐一句，就交给进程内的微批推理服务（inference_service）用本地情感模型
+（IDEA-CCNL/Erlangshen-Roberta-110M-Sentiment）打分，token 流不等待；
+界面在刷新时取回已完成的分数，更新人物当前的心情。
+
+- 模型由推理服务持有，每个进程只加载一次，且在服务线程中加载，首个回复不会因此卡住
+- 分数按句子哈希缓存
+- 默认关闭，设置 CIALLO_EMOTION=1 开启；未安装 transformers / torch 时无法开启
+- 回复结束时不等待最后几句的分数，尚未完成的在之后的刷新中应用
+"""
+import hashlib
+import importlib.util
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, wait
+
+from inference_service import SENTIMENT_BACKEND, sentiment_service
+from stream_render import SENTENCE_ENDINGS
+
+EMOTION_CACHE_SIZE = int(os.getenv("CIALLO_EMOTION_CACHE_SIZE", "4096"))
+# wait() 最多等待打分的时间（秒），仅供离线脚本使用，界面不等待
+EMOTION_FINAL_WAIT = 0.3
+# 短于该长度的片段（如单独的标点）不打分
+MIN_SENTENCE_CHARS = 2
+# 最新一句在心情中的权重（指数滑动平均）
+MOOD_SMOOTHING = 0.5
+
+# (分数下限, 表情, 心情)，分数范围 [-1, 1]
+MOODS = [
+    (0.5, "😊", "开心"),
+    (0.15, "🙂", "愉快"),
+    (-0.15, "😐", "平静"),
+    (-0.5, "😟", "低落"),
+    (-1.0, "😢", "难过"),
+]
+
+
+def emotion_available() -> bool:
+    """情感模型需要额外安装 transformers，以及 torch（onnx 后端为 onnxruntime）"""
+    runtime = "onnxruntime" if SENTIMENT_BACKEND == "onnx" else "torch"
+    return all(importlib.util.find_spec(name) is not None for name in ("transformers", runtime))
+
+
+EMOTION_AVAILABLE = emotion_available()
+# 需要下载并在 CPU 上运行情感模型，默认关闭
+EMOTION_ENABLED = os.getenv("CIALLO_EMOTION", "0") == "1" and EMOTION_AVAILABLE
+
+
+def sentence_key(sentence: str) -> str:
+    return hashlib.sha1(sentence.encode("utf-8")).hexdigest()[:16]
+
+
+def signed_score(result: dict) -> float:
+    """把 {label, score} 转为 [-1, 1] 的分数，正面为正"""
+    positive = result["label"].lower().startswith("pos")
+    return result["score"] if positive else -result["score"]
+
+
+def mood_label(score: float) -> tuple:
+    """分数对应的 (表情, 心情)"""
+    for lower, emoji, name in MOODS:
+        if score >= lower:
+            return emoji, name
+    return MOODS[-1][1], MOODS[-1][2]
+
+
+class EmotionScorer:
+    """按句子哈希缓存分数，未命中的句子交给微批推理服务"""
+
+    def __init__(self, service=sentiment_service, cache_size: int = EMOTION_CACHE_SIZE):
+        self.service = service
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # 句子哈希 -> 分数
+        self._inflight = {}          # 句子哈希 -> Future，相同句子只推理一次
+        self.cache_hits = 0
+
+    def submit(self, sentence: str) -> Future:
+        """提交一句，返回分数的 Future"""
+        key = sentence_key(sentence)
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                future = Future()
+                future.set_result(score)
+                return future
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._inflight[key] = Future()
+        self.service.submit(sentence).add_done_callback(lambda result: self._on_scored(key, future, result))
+        return future
+
+    def _on_scored(self, key: str, future: Future, result: Future):
+        error = result.exception()
+        score = None if error else signed_score(result.result())
+        with self._lock:
+            self._inflight.pop(key, None)
+            if error is None:
+                self._cache[key] = score
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(score)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"cache_hits": self.cache_hits, "cached": len(self._cache)}
+
+
+# 进程级单例
+emotion_scorer = EmotionScorer()
+
+
+class MoodTracker:
+    """跟踪一条回复的情绪：凑齐整句就提交打分，poll() 只取已完成的结果，从不阻塞"""
+
+    def __init__(self, scorer: EmotionScorer = emotion_scorer, initial: float = None):
+        self.scorer = scorer
+        self.score = initial
+        self._buffer = ""
+        self._futures = []
+        self._applied = 0
+
+    def feed(self, delta: str):
+        for char in delta:
+            self._buffer += char
+            if char in SENTENCE_ENDINGS:
+                self._submit()
+
+    def finish(self):
+        """回复结束：提交最后不完整的一句"""
+        self._submit()
+
+    def _submit(self):
+        sentence = self._buffer.strip()
+        self._buffer = ""
+        if len(sentence) >= MIN_SENTENCE_CHARS:
+            self._futures.append(self.scorer.submit(sentence))
+
+    def poll(self) -> bool:
+        """按句子顺序应用已完成的分数，心情有变化时返回 True"""
+        changed = False
+        while self._applied < len(self._futures) and self._futures[self._applied].done():
+            future = self._futures[self._applied]
+            self._applied += 1
+            if future.exception() is not None:
+                continue
+            score = future.result()
+            self.score = score if self.score is None else (
+                MOOD_SMOOTHING * score + (1 - MOOD_SMOOTHING) * self.score
+            )
+            changed = True
+        return changed
+
+    @property
+    def settled(self) -> bool:
+        """所有已提交的句子都已应用"""
+        return self._applied >= len(self._futures)
+
+    def wait(self, timeout: float = EMOTION_FINAL_WAIT) -> bool:
+        """等待剩余句子打分（有上限），然后应用结果"""
+        wait(self._futures[self._applied:], timeout=timeout)
+        return self.poll()
+
+    def mood(self):
+        return mood_label(self.score) if self.score is not None else None
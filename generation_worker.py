@@ -0,0 +1,187 @@
+"""后台生成工作线程
+
+回复不再在 Streamlit 脚本中同步生成：提交后由进程级线程池中的工作线程消费上游流，
+把增量写入该会话的 ReplyBuffer；界面中的聊天区域是一个按间隔自动重跑的片段
+（st.fragment），只读取缓冲区渲染。侧边栏和人物切换引起的 rerun 不会打断生成，
+回复结束后由下一次运行写入历史。
+
+线程数与排队上限可通过环境变量调整，超过排队上限的请求直接拒绝。
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from stream_render import ThrottledRenderer
+
+logger = logging.getLogger(__name__)
+
+GENERATION_WORKERS = int(os.getenv("CIALLO_GENERATION_WORKERS", "8"))
+# 等待空闲线程的请求数上限（不含正在生成的）
+GENERATION_QUEUE_DEPTH = int(os.getenv("CIALLO_GENERATION_QUEUE_DEPTH", "32"))
+
+
+class QueueFullError(Exception):
+    """生成队列已满"""
+
+
+class ReplyBuffer:
+    """一条回复的增量缓冲区：工作线程写入，界面轮询读取"""
+
+    def __init__(self, agent: str, client=None, api_provider: str = None):
+        self.agent = agent
+        # 回复结束后写入历史时用于调度摘要
+        self.client = client
+        self.api_provider = api_provider
+        self.text = ""
+        self.chunks = 0
+        # 界面只显示节流后的文本（visible_text）
+        self.renderer = ThrottledRenderer()
+        self.usage = None
+        self.mood = None
+        # 回复结束时仍有句子未打完分的 MoodTracker，写入历史后继续在界面刷新时应用
+        self.mood_tracker = None
+        self.error = None
+        self.submitted_at = time.perf_counter()
+        self.first_delta_at = None
+        self.finished_at = None
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._response = None
+        self._response_lock = threading.Lock()
+
+    def append(self, delta: str):
+        if self.first_delta_at is None:
+            self.first_delta_at = time.perf_counter()
+        self.text += delta
+        self.chunks += 1
+        self.renderer.feed(delta)
+
+    @property
+    def visible_text(self) -> str:
+        return self.renderer.visible
+
+    @property
+    def frames(self) -> int:
+        return self.renderer.frames_pushed
+
+    def attach(self, response):
+        """登记正在消费的上游流，以便 cancel() 直接关闭；已取消时立即关闭"""
+        with self._response_lock:
+            self._response = response
+        if self.cancelled:
+            self.close_response()
+
+    def close_response(self):
+        """关闭已登记的上游流（可重复调用）"""
+        with self._response_lock:
+            response, self._response = self._response, None
+        if response is not None:
+            try:
+                response.close()
+            except Exception as e:
+                logger.error(f"关闭上游流失败: {str(e)}")
+
+    def cancel(self):
+        """请求停止并立即关闭上游流，首 token 之前也能中止请求"""
+        self._cancelled.set()
+        self.close_response()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def finish(self, error: Exception = None):
+        if self._done.is_set():
+            return
+        self.error = error
+        self.renderer.finish()
+        self.finished_at = time.perf_counter()
+        self._done.set()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+
+def stream_into(buffer: ReplyBuffer, response, on_delta=None):
+    """把流式响应的增量写入缓冲区，返回 usage；任何方式结束时都关闭上游流"""
+    usage = None
+    buffer.attach(response)
+    try:
+        for chunk in response:
+            if buffer.cancelled:
+                break
+            # usage 通常在最后一个块中返回
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                buffer.append(chunk.choices[0].delta.content)
+                if on_delta:
+                    on_delta(chunk.choices[0].delta.content)
+    except Exception:
+        # 停止时从其他线程关闭流，读取端抛出的异常不算错误，保留已生成的部分
+        if not buffer.cancelled:
+            raise
+    finally:
+        buffer.close_response()
+    return usage
+
+
+class GenerationPool:
+    """固定大小的线程池 + 有上限的等待队列"""
+
+    def __init__(self, workers: int = GENERATION_WORKERS, queue_depth: int = GENERATION_QUEUE_DEPTH):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="generation")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, buffer: ReplyBuffer, job) -> ReplyBuffer:
+        """在工作线程中执行 job(buffer)，队列已满时抛出 QueueFullError"""
+        with self._lock:
+            if self.queued >= self.queue_depth:
+                self.rejected += 1
+                raise QueueFullError(f"生成队列已满（{self.queue_depth}）")
+            self.queued += 1
+        self._executor.submit(self._run, buffer, job)
+        return buffer
+
+    def _run(self, buffer: ReplyBuffer, job):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            if not buffer.cancelled:
+                job(buffer)
+            buffer.finish()
+        except Exception as e:
+            logger.error(f"生成响应时出错: {str(e)}")
+            buffer.finish(error=e)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "active": self.active,
+                "queued": self.queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+# 进程级单例：所有会话共享
+generation_pool = GenerationPool()
@@ -0,0 +1,136 @@
+"""群聊：一条消息同时发给多个人物
+
+群聊是与四段单聊并列的第五段对话（GROUP_CHAT），历史是一份共享记录，
+人物的发言带 speaker 字段。发给每个人物的是以她为视角改写的记录：
+她自己的发言是 assistant，用户与其他人物的发言合并为 user 消息，其他人物的发言前标注【名字】。
+
+发言顺序：
+- 用户消息中点了名时只由被点名的人物回复，否则四人都回复；
+- 本轮回复同时在进程级生成线程池中生成（共享连接池），总耗时接近最慢的一条，而不是各条之和；
+- 写入共享记录的先后由 CIALLO_GROUP_ORDER 决定："arrival" 按首个 token 到达的先后（先开口的先说），
+  "fixed" 按点名顺序 / 人物的固定顺序。
+同一轮的人物看不到彼此本轮的回复，下一轮才会看到。本地模型在 CPU 上串行生成，群聊不会更快。
+"""
+import os
+import time
+
+from agent import prepare_messages
+from context_window import count_message_tokens
+from generation_worker import QueueFullError
+from personas import AGENT_NAMES
+
+GROUP_CHAT = "group"
+GROUP_NAME = "群聊"
+GROUP_ORDER = os.getenv("CIALLO_GROUP_ORDER", "arrival")
+
+GROUP_HINT = (
+    "现在是群聊，{others}也在场。其他人的发言以【名字】开头，没有标注的是用户的发言。"
+    "只以你自己的身份回复，不要替别人说话，也不要在开头写自己的名字。"
+)
+
+
+def responders(text: str) -> list:
+    """本轮回复的人物：按点名先后排列，没有点名时为全部人物"""
+    mentioned = sorted(
+        (text.find(name), agent) for agent, name in AGENT_NAMES.items() if name in text
+    )
+    return [agent for _, agent in mentioned] or list(AGENT_NAMES)
+
+
+def persona_view(agent: str, transcript: list) -> list:
+    """把共享记录改写为 agent 视角的单聊历史"""
+    view = []
+    for msg in transcript:
+        if msg["role"] == "assistant" and msg.get("speaker") == agent:
+            view.append({"role": "assistant", "content": msg["content"]})
+            continue
+        content = msg["content"] if msg["role"] == "user" else f"【{AGENT_NAMES[msg['speaker']]}】{msg['content']}"
+        if view and view[-1]["role"] == "user":
+            view[-1] = {"role": "user", "content": f"{view[-1]['content']}\n\n{content}"}
+        else:
+            view.append({"role": "user", "content": content})
+    return view
+
+
+def prepare_group_messages(agent: str, transcript: list, api_provider: str, model: str,
+                           summary_state: dict = None, use_example_retrieval: bool = True):
+    """组装 agent 在群聊中的本轮消息，返回 (messages, stats)
+
+    系统提示仍在最前，前缀缓存与单聊共用；群聊说明紧随其后。
+    """
+    covered = summary_state["covered"] if summary_state else 0
+    # 视图已从摘要覆盖处开始截取，传给 prepare_messages 的摘要状态覆盖位置归零
+    messages, stats = prepare_messages(
+        agent,
+        persona_view(agent, transcript[covered:]),
+        api_provider,
+        model,
+        summary_state=dict(summary_state, covered=0) if summary_state else None,
+        use_example_retrieval=use_example_retrieval
+    )
+    others = "、".join(name for other, name in AGENT_NAMES.items() if other != agent)
+    hint = {"role": "system", "content": GROUP_HINT.format(others=others)}
+    messages.insert(1, hint)
+    stats["sent_tokens"] += count_message_tokens(hint)
+    return messages, stats
+
+
+class GroupReply:
+    """一轮群聊中同时生成的多条回复（每个人物一个 ReplyBuffer）"""
+
+    def __init__(self, replies: list):
+        self.agent = GROUP_CHAT
+        self.replies = replies
+        self.submitted_at = time.perf_counter()
+
+    def cancel(self):
+        for reply in self.replies:
+            reply.cancel()
+
+    @property
+    def done(self) -> bool:
+        return all(reply.done for reply in self.replies)
+
+    def wait(self, timeout: float = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for reply in self.replies:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not reply.wait(remaining):
+                return False
+        return True
+
+    @property
+    def chunks(self) -> int:
+        return sum(reply.chunks for reply in self.replies)
+
+    @property
+    def frames(self) -> int:
+        return sum(reply.frames for reply in self.replies)
+
+    @property
+    def finished_at(self):
+        if not self.done:
+            return None
+        return max(reply.finished_at for reply in self.replies)
+
+    def ordered(self) -> list:
+        """按发言顺序排列的回复；没有产出内容的排在最后"""
+        if GROUP_ORDER != "arrival":
+            return list(self.replies)
+        return sorted(self.replies, key=lambda reply: (reply.first_delta_at is None, reply.first_delta_at or 0))
+
+
+def submit_group(pool, jobs: list) -> GroupReply:
+    """把 (ReplyBuffer, job) 全部提交到生成线程池
+
+    任意一条被拒绝时取消已提交的回复并抛出 QueueFullError，不会出现只有部分人物回复的一轮。
+    """
+    submitted = []
+    try:
+        for buffer, job in jobs:
+            submitted.append(pool.submit(buffer, job))
+    except QueueFullError:
+        for buffer in submitted:
+            buffer.cancel()
+        raise
+    return GroupReply(submitted)
@@ -0,0 +1,176 @@
+"""跨提供商对冲请求
+
+主线路在阈值（通常取首 token 延迟的 p95）内没有返回首个 token 时，
+把同样的消息再发给备用线路，先产出 token 的一方胜出，另一方的流立即关闭。
+
+落败的主线路不再等待它的首 token，因此无法测出确切的节省量；
+统计只记录胜出线路的首 token 时间与对冲阈值，以及主线路是否被取消。
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+from agent import run_agent
+from resilience import AgentError
+
+logger = logging.getLogger(__name__)
+
+HEDGE_THRESHOLD_MS = int(os.getenv("CIALLO_HEDGE_THRESHOLD_MS", "1500"))
+# 等待任一线路首个 token 的总时长上限
+HEDGE_TOTAL_TIMEOUT = float(os.getenv("CIALLO_HEDGE_TOTAL_TIMEOUT", "60"))
+
+# 备用线路的默认模型
+BACKUP_MODELS = {
+    "OpenAI 官方": "gpt-4o-mini",
+    "硅基流动 (SiliconFlow)": "deepseek-ai/DeepSeek-V3",
+    "DeepSeek": "deepseek-chat",
+}
+
+
+class HedgeLeg:
+    """一条线路：(名称, 客户端, 模型)"""
+
+    def __init__(self, label: str, client, model: str, include_usage: bool = False,
+                 telemetry_tags: dict = None):
+        self.label = label
+        self.telemetry_tags = {"provider": label, "hedge": True, **(telemetry_tags or {})}
+        self.client = client
+        self.model = model
+        self.include_usage = include_usage
+        self.chunks = queue.Queue()
+        self.response = None
+        self.started_at = None
+        self.first_token_at = None
+        self.error = None
+        self.finished = threading.Event()
+        self._cancelled = threading.Event()
+
+    def start(self, messages: list, on_first_token):
+        self.started_at = time.monotonic()
+        threading.Thread(target=self._run, args=(messages, on_first_token), daemon=True).start()
+
+    def _run(self, messages: list, on_first_token):
+        try:
+            response = run_agent(
+                self.client,
+                self.model,
+                messages,
+                stream=True,
+                include_usage=self.include_usage,
+                telemetry_tags=self.telemetry_tags
+            )
+            self.response = response
+            if self._cancelled.is_set():
+                response.close()
+                return
+            for chunk in response:
+                if self._cancelled.is_set():
+                    break
+                if self.first_token_at is None and chunk.choices and chunk.choices[0].delta.content:
+                    self.first_token_at = time.monotonic()
+                    on_first_token(self)
+                self.chunks.put(chunk)
+        except Exception as e:
+            if not self._cancelled.is_set():
+                self.error = e
+        finally:
+            self.finished.set()
+            self.chunks.put(None)
+
+    def cancel(self):
+        """关闭上游流，停止消耗 token"""
+        self._cancelled.set()
+        if self.response is not None:
+            try:
+                self.response.close()
+            except Exception as e:
+                logger.error(f"关闭对冲线路失败: {str(e)}")
+
+    @property
+    def ttft(self):
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+
+class HedgedStream:
+    """对冲后的流，可像普通流式响应一样迭代"""
+
+    def __init__(self, primary: HedgeLeg, backup: HedgeLeg, messages: list,
+                 threshold_ms: int = HEDGE_THRESHOLD_MS):
+        self.primary = primary
+        self.backup = backup
+        self.messages = messages
+        self.threshold = threshold_ms / 1000
+        self.winner = None
+        self.hedged = False
+        self._lock = threading.Lock()
+        self._decided = threading.Event()
+        self._turn_start = None
+        # 本轮对冲结果；primary_cancelled 表示备用线路胜出、主线路在首 token 前被关闭
+        self.stats = {
+            "hedged": False,
+            "winner": None,
+            "winner_ttft_ms": None,
+            "threshold_ms": threshold_ms,
+            "primary_cancelled": False,
+        }
+
+    def _on_first_token(self, leg: HedgeLeg):
+        with self._lock:
+            if self.winner is None:
+                self.winner = leg
+                self._decided.set()
+
+    def _wait(self, timeout: float, legs: list) -> bool:
+        """等到有线路胜出、或所有线路都已失败、或超时"""
+        deadline = time.monotonic() + timeout
+        while not self._decided.is_set():
+            if all(leg.finished.is_set() for leg in legs):
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._decided.wait(min(remaining, 0.02))
+        return True
+
+    def __iter__(self):
+        self._turn_start = time.monotonic()
+        self.primary.start(self.messages, self._on_first_token)
+        if not self._wait(self.threshold, [self.primary]):
+            self.hedged = True
+            self.backup.start(self.messages, self._on_first_token)
+            self._wait(HEDGE_TOTAL_TIMEOUT, [self.primary, self.backup])
+
+        if self.winner is None:
+            self.primary.cancel()
+            self.backup.cancel()
+            raise self.primary.error or self.backup.error or AgentError("对冲请求超时", retryable=True)
+
+        winner_ttft = self.winner.first_token_at - self._turn_start
+        self.stats.update(
+            hedged=self.hedged,
+            winner=self.winner.label,
+            winner_ttft_ms=int(winner_ttft * 1000),
+        )
+        loser = self.backup if self.winner is self.primary else self.primary
+        loser.cancel()
+        self.stats["primary_cancelled"] = loser is self.primary
+
+        try:
+            while True:
+                chunk = self.winner.chunks.get()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # 正常结束时无副作用；提前停止迭代时关闭胜出线路
+            self.winner.cancel()
+        if self.winner.error:
+            raise self.winner.error
+
+    def close(self):
+        self.primary.cancel()
+        self.backup.cancel()
@@ -0,0 +1,87 @@
+"""分窗口渲染对话历史
+
+只把最近的若干条消息渲染为独立的聊天气泡；更早的消息按固定的序号分页，
+点击“加载更早的消息”后才逐页显示。已结束的分页内容不会再变化，
+渲染好的 Markdown 按 (人物, 页起点) 缓存在会话中，每页只生成一个元素，
+较大的页还能命中 Streamlit 的消息缓存，rerun 时不再重复序列化。
+"""
+import os
+
+import streamlit as st
+
+from assets import persona_avatar
+from conversation_store import get_store
+from personas import AGENT_NAMES
+
+# 独立渲染的最近消息数（至少）
+RENDER_WINDOW = int(os.getenv("CIALLO_RENDER_WINDOW", "20"))
+# 每页消息数
+RENDER_PAGE = int(os.getenv("CIALLO_RENDER_PAGE", "20"))
+
+
+def reset_history_view():
+    """重置分页状态和已渲染分页的缓存"""
+    st.session_state.history_pages = {}
+    st.session_state.rendered_pages = {}
+
+
+def _page_messages(agent: str, page_start: int) -> list:
+    """取出序号在 [page_start, page_start + RENDER_PAGE) 的消息"""
+    offset = st.session_state.agent_offsets[agent]
+    memory = st.session_state.agent_messages[agent]
+    page_end = page_start + RENDER_PAGE
+    if page_start >= offset:
+        return memory[page_start - offset:page_end - offset]
+    # 已移出内存的部分从数据库读取
+    _, stored = get_store().load_page(
+        st.session_state.session_id, agent, before_seq=min(page_end, offset), limit=min(page_end, offset) - page_start
+    )
+    return stored + memory[:max(page_end - offset, 0)]
+
+
+def _page_markdown(agent: str, page_start: int) -> str:
+    key = (agent, page_start)
+    rendered = st.session_state.rendered_pages.get(key)
+    if rendered is None:
+        parts = []
+        for msg in _page_messages(agent, page_start):
+            if msg["role"] == "system":
+                continue
+            speaker = "👤 你" if msg["role"] == "user" else AGENT_NAMES[msg.get("speaker", agent)]
+            parts.append(f"**{speaker}**\n\n{msg['content']}")
+        rendered = st.session_state.rendered_pages[key] = "\n\n---\n\n".join(parts)
+    return rendered
+
+
+def render_history(agent: str):
+    """渲染当前人物的对话历史（需在目标容器内调用）"""
+    if "history_pages" not in st.session_state:
+        reset_history_view()
+    offset = st.session_state.agent_offsets[agent]
+    memory = st.session_state.agent_messages[agent]
+    total = offset + len(memory)
+
+    # 独立渲染区的起点按页对齐，使其前面的分页内容固定不变
+    recent_start = max((total - RENDER_WINDOW) // RENDER_PAGE * RENDER_PAGE, 0)
+    pages = st.session_state.history_pages.get(agent, 0)
+    if recent_start - pages * RENDER_PAGE > 0:
+        # 标签保持不变，否则按钮会被视为新控件
+        if st.button("⬆ 加载更早的消息", key=f"load_earlier_{agent}",
+                     help=f"每次加载 {RENDER_PAGE} 条"):
+            pages += 1
+            st.session_state.history_pages[agent] = pages
+
+    first_page = max(recent_start - pages * RENDER_PAGE, 0)
+    for page_start in range(first_page, recent_start, RENDER_PAGE):
+        with st.container(border=True):
+            st.markdown(_page_markdown(agent, page_start))
+
+    for msg in memory[max(recent_start - offset, 0):]:
+        if msg["role"] == "system":
+            continue
+        avatar = persona_avatar(msg.get("speaker", agent)) if msg["role"] == "assistant" else None
+        with st.chat_message(name=msg["role"], avatar=avatar):
+            # 群聊中标出发言的人物
+            if "speaker" in msg:
+                st.caption(AGENT_NAMES[msg["speaker"]])
+            st.markdown(msg["content"])
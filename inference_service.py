@@ -0,0 +1,292 @@
+"""进程内动态微批推理服务
+
+一个服务独占一份模型，所有会话的请求进入同一个队列；工作线程每次取出
+最多 max_batch_size 条、最多等待 max_wait 秒，补齐（padding）成一个批次推理，
+结果通过 Future 交还调用方。负载越高批次越大，单条请求分摊到的开销越小，
+而不是每个会话各自串行调用、或各自加载一份模型。
+
+批大小与排队时间按直方图统计，可在界面和 /v1/inference/stats 查看。
+
+情感模型后端由 CIALLO_SENTIMENT_BACKEND 选择：torch（fp32）、int8（动态量化）或 onnx。
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+SENTIMENT_MODEL = os.getenv("CIALLO_SENTIMENT_MODEL", "IDEA-CCNL/Erlangshen-Roberta-110M-Sentiment")
+SENTIMENT_MAX_LENGTH = 128
+# 情感模型后端：torch（fp32）、int8（torch 动态量化）、onnx（ONNX Runtime，需要 onnxruntime）
+SENTIMENT_BACKEND = os.getenv("CIALLO_SENTIMENT_BACKEND", "torch")
+# 推理线程数，0 表示使用库的默认值
+INFERENCE_THREADS = int(os.getenv("CIALLO_INFERENCE_THREADS", "0"))
+ONNX_DIR = os.getenv("CIALLO_ONNX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+INFERENCE_MAX_BATCH = int(os.getenv("CIALLO_INFERENCE_MAX_BATCH", "32"))
+INFERENCE_MAX_WAIT = float(os.getenv("CIALLO_INFERENCE_MAX_WAIT_MS", "10")) / 1000
+
+# 直方图桶上界
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    """固定桶直方图，最后一个桶为 +Inf"""
+
+    def __init__(self, bounds: tuple):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self) -> dict:
+        labels = [f"≤{b:g}" for b in self.bounds] + ["+Inf"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else None,
+        }
+
+
+class BatchingService:
+    """把单条请求合并成批次交给 batch_fn(list) -> list 处理"""
+
+    def __init__(self, name: str, batch_fn, max_batch_size: int = INFERENCE_MAX_BATCH,
+                 max_wait: float = INFERENCE_MAX_WAIT):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_wait_ms = Histogram(QUEUE_WAIT_BUCKETS_MS)
+        self.requests = 0
+        self.failures = 0
+
+    def submit(self, item) -> Future:
+        """提交一条请求，立即返回 Future"""
+        future = Future()
+        with self._lock:
+            self.requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-batcher", daemon=True)
+                self._thread.start()
+        self._queue.put((time.perf_counter(), item, future))
+        return future
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get()]
+                deadline = time.perf_counter() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    try:
+                        batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                # 调用方已取消（如 HTTP 客户端断开）的请求直接丢弃
+                batch = [entry for entry in batch if entry[2].set_running_or_notify_cancel()]
+                if batch:
+                    self._process(batch)
+            except Exception as e:
+                # 单个批次出错不能让工作线程退出，否则之后的请求会一直挂起
+                logger.error(f"{self.name} 批处理线程异常: {str(e)}")
+
+    @staticmethod
+    def _resolve(future: Future, result=None, error: Exception = None):
+        """设置结果；Future 已被取消或已完成时忽略"""
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _process(self, batch: list):
+        started = time.perf_counter()
+        with self._lock:
+            self.batch_sizes.observe(len(batch))
+            for enqueued_at, _, _ in batch:
+                self.queue_wait_ms.observe((started - enqueued_at) * 1000)
+        try:
+            results = self.batch_fn([item for _, item, _ in batch])
+        except Exception as e:
+            logger.error(f"{self.name} 批量推理失败: {str(e)}")
+            with self._lock:
+                self.failures += len(batch)
+            for _, _, future in batch:
+                self._resolve(future, error=e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            self._resolve(future, result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "queue_depth": self._queue.qsize(),
+                "batch_size": self.batch_sizes.snapshot(),
+                "queue_wait_ms": self.queue_wait_ms.snapshot(),
+            }
+
+
+def _onnx_available() -> bool:
+    """ONNX 后端需要额外安装 onnxruntime"""
+    try:
+        import onnxruntime  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _to_results(probs, id2label: dict) -> list:
+    """每行概率取最大的类别"""
+    return [{"label": id2label[int(row.argmax())], "score": float(row.max())} for row in probs]
+
+
+class TorchSentimentRunner:
+    """transformers + torch 推理；quantize=True 时对线性层做动态 int8 量化"""
+
+    def __init__(self, quantize: bool = False, threads: int = INFERENCE_THREADS):
+        import torch
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.torch = torch
+        self.tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+        model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+        self.id2label = model.config.id2label
+
+    def __call__(self, texts: list) -> list:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=SENTIMENT_MAX_LENGTH,
+                                 return_tensors="pt")
+        with self.torch.inference_mode():
+            probs = self.model(**encoded).logits.softmax(dim=-1)
+        return _to_results(probs.numpy(), self.id2label)
+
+
+class OnnxSentimentRunner:
+    """ONNX Runtime 推理；首次使用时把模型导出到 ONNX_DIR"""
+
+    def __init__(self, threads: int = INFERENCE_THREADS):
+        import onnxruntime
+        from transformers import AutoConfig, AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+        self.id2label = AutoConfig.from_pretrained(SENTIMENT_MODEL).id2label
+        path = export_onnx()
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, texts: list) -> list:
+        import numpy as np
+
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=SENTIMENT_MAX_LENGTH,
+                                 return_tensors="np")
+        feeds = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+        logits = self.session.run(None, feeds)[0]
+        exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+        return _to_results(exp / exp.sum(axis=-1, keepdims=True), self.id2label)
+
+
+def export_onnx() -> str:
+    """把 fp32 模型导出为 ONNX（已存在则直接返回路径）"""
+    path = os.path.join(ONNX_DIR, SENTIMENT_MODEL.replace("/", "__") + ".onnx")
+    if os.path.exists(path):
+        return path
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(SENTIMENT_MODEL)
+    model = AutoModelForSequenceClassification.from_pretrained(SENTIMENT_MODEL)
+    model.eval()
+    # return_dict=False 让导出的图只输出 logits
+    model.config.return_dict = False
+    sample = tokenizer(["导出样例", "用于确定输入格式的句子"], padding=True, return_tensors="pt")
+    names = list(sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+    dynamic_axes["logits"] = {0: "batch"}
+    os.makedirs(ONNX_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in names),
+            tmp_path,
+            input_names=names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+    os.replace(tmp_path, path)
+    return path
+
+
+SENTIMENT_BACKENDS = {
+    "torch": lambda threads: TorchSentimentRunner(threads=threads),
+    "int8": lambda threads: TorchSentimentRunner(quantize=True, threads=threads),
+    "onnx": lambda threads: OnnxSentimentRunner(threads=threads),
+}
+
+
+# 加载失败的配置 -> 异常；离线或无法访问 Hub 时不在每个批次重新下载
+_load_errors = {}
+
+
+def load_sentiment_runner(backend: str = SENTIMENT_BACKEND, threads: int = INFERENCE_THREADS):
+    """按配置加载情感模型后端（每个进程每种配置一次，失败后不再重试）"""
+    error = _load_errors.get((backend, threads))
+    if error is not None:
+        raise error
+    try:
+        return _load_sentiment_runner(backend, threads)
+    except Exception as e:
+        logger.error(f"情感模型加载失败，本进程内不再重试: {str(e)}")
+        _load_errors[(backend, threads)] = e
+        raise
+
+
+@lru_cache(maxsize=None)
+def _load_sentiment_runner(backend: str, threads: int):
+    if backend not in SENTIMENT_BACKENDS:
+        raise ValueError(f"未知情感模型后端: {backend}")
+    if backend == "onnx" and not _onnx_available():
+        logger.warning("未安装 onnxruntime，情感模型已回退为 torch 后端")
+        backend = "torch"
+    return SENTIMENT_BACKENDS[backend](threads)
+
+
+def score_sentiment_batch(texts: list) -> list:
+    """补齐成一个批次做前向推理，返回 [{label, score}]"""
+    return load_sentiment_runner()(texts)
+
+
+# 进程级单例：所有会话共享一份情感模型
+sentiment_service = BatchingService("sentiment", score_sentiment_batch)
@@ -0,0 +1,315 @@
+"""多会话负载测试
+
+启动真实的 `streamlit run app.py` 子进程，用无界面的 websocket 客户端模拟 N 个并发会话
+（与浏览器前端相同的 BackMsg / ForwardMsg 协议）。每个会话选择提供商、切换人物、
+发送消息，历史随之增长。上游使用本地模拟服务，无需网络。
+
+回复在后台生成，会话像浏览器一样按聊天片段的自动重跑间隔轮询，直到回复写入历史。
+
+逐级增加并发会话数，报告每级提交消息的 rerun 延迟与完整回复耗时的分位数、吞吐、
+服务端每会话内存与线程数，并找出吞吐不再随并发增长（崩塌）的位置。
+
+用法:
+    python load_test.py --levels 1,2,4,8,16 --turns 6
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import HTTPRequest
+from tornado.websocket import websocket_connect
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MOCK_OPTIONS = {"ttft_ms": 150, "tokens_per_sec": 300, "reply_chars": 120, "chunk_chars": 2}
+PROVIDER = "DeepSeek"
+PERSONA_BUTTONS = ["丛雨", "朝武芳乃", "常陆茉子", "蕾娜"]
+# 每隔几轮切换一次人物
+SWITCH_EVERY = 3
+RUN_TIMEOUT = 120
+# 吞吐增幅低于该比例视为崩塌
+COLLAPSE_GAIN = 1.1
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)] if values else 0.0
+
+
+def process_status(pid: int) -> tuple:
+    """读取进程的常驻内存（MB）与线程数"""
+    rss_mb, threads = 0.0, 0
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_mb = int(line.split()[1]) / 1024
+            elif line.startswith("Threads:"):
+                threads = int(line.split()[1])
+    return rss_mb, threads
+
+
+def start_app(port: int, env: dict, script: str = "app.py") -> subprocess.Popen:
+    """启动 streamlit 服务并等待就绪"""
+    args = [
+        sys.executable, "-m", "streamlit", "run", os.path.join(BASE_DIR, script),
+        "--server.headless", "true",
+        "--server.port", str(port),
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    process = subprocess.Popen(args, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("streamlit 服务启动失败")
+
+
+class Session:
+    """一个无界面的浏览器会话"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.conn = None
+        self.widgets = {}  # (类型, 标签) -> 控件元素
+        self.fragments = {}  # 控件 ID -> 所在片段 ID，与浏览器一样只重跑该片段
+        self.query_string = ""
+        self.exceptions = []
+        self.auto_rerun = None  # (间隔秒, 片段 ID)，浏览器会按该间隔重跑片段
+
+    async def connect(self):
+        url = f"ws://127.0.0.1:{self.port}/_stcore/stream"
+        request = HTTPRequest(url, headers={"Origin": f"http://127.0.0.1:{self.port}"})
+        self.conn = await websocket_connect(request, max_message_size=64 * 1024 * 1024)
+        return await self.rerun()
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+    async def rerun(self, *states, fragment_id: str = None, is_auto_rerun: bool = False) -> float:
+        """发送一次 rerun（指定 fragment_id 时只重跑该片段）并等待执行完毕，返回耗时（秒）"""
+        msg = BackMsg()
+        msg.rerun_script.query_string = self.query_string
+        msg.rerun_script.widget_states.widgets.extend(states)
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+            msg.rerun_script.is_auto_rerun = is_auto_rerun
+        start = time.perf_counter()
+        await self.conn.write_message(msg.SerializeToString(), binary=True)
+        await asyncio.wait_for(self._read_until_finished(), RUN_TIMEOUT)
+        return time.perf_counter() - start
+
+    async def _read_until_finished(self):
+        while True:
+            data = await self.conn.read_message()
+            if data is None:
+                raise ConnectionError("websocket 连接已关闭")
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            kind = msg.WhichOneof("type")
+            if kind == "new_session" and not msg.new_session.fragment_ids_this_run:
+                # 整页运行：控件与自动重跑都以本次运行为准
+                self.widgets = {}
+                self.fragments = {}
+                self.auto_rerun = None
+            elif kind == "auto_rerun":
+                self.auto_rerun = (msg.auto_rerun.interval, msg.auto_rerun.fragment_id)
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                element_type = element.WhichOneof("type")
+                proto = getattr(element, element_type)
+                if element_type == "exception":
+                    self.exceptions.append(proto.message)
+                elif getattr(proto, "id", ""):
+                    label = getattr(proto, "label", "") or getattr(proto, "placeholder", "")
+                    self.widgets[(element_type, label)] = proto
+                    self.fragments[proto.id] = msg.delta.fragment_id
+            elif kind == "page_info_changed":
+                self.query_string = msg.page_info_changed.query_string
+            elif kind == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                return
+
+    def _widget(self, element_type: str, label: str = None):
+        for (kind, widget_label), proto in self.widgets.items():
+            if kind == element_type and (label is None or widget_label == label):
+                return proto
+        raise LookupError(f"找不到控件 {element_type} {label or ''}")
+
+    async def _send(self, state: WidgetState) -> float:
+        return await self.rerun(state, fragment_id=self.fragments.get(state.id))
+
+    async def choose(self, element_type: str, label: str, option: str) -> float:
+        widget = self._widget(element_type, label)
+        return await self._send(WidgetState(id=widget.id, int_value=list(widget.options).index(option)))
+
+    async def type_text(self, element_type: str, label: str, text: str) -> float:
+        return await self._send(WidgetState(id=self._widget(element_type, label).id, string_value=text))
+
+    async def check(self, label: str, value: bool) -> float:
+        return await self._send(WidgetState(id=self._widget("checkbox", label).id, bool_value=value))
+
+    async def click(self, label: str) -> float:
+        return await self._send(WidgetState(id=self._widget("button", label).id, trigger_value=True))
+
+    async def chat(self, text: str) -> float:
+        state = WidgetState(id=self._widget("chat_input").id)
+        state.string_trigger_value.data = text
+        return await self._send(state)
+
+    async def wait_reply(self) -> int:
+        """像浏览器一样按间隔重跑聊天片段，直到回复写入历史（片段触发整页 rerun）；返回轮询次数"""
+        polls = 0
+        while self.auto_rerun:
+            interval, fragment_id = self.auto_rerun
+            await asyncio.sleep(interval)
+            await self.rerun(fragment_id=fragment_id, is_auto_rerun=True)
+            polls += 1
+        return polls
+
+
+async def run_session(session_no: int, port: int, turns: int, latencies: list, errors: list, ready, go):
+    """单个会话：初始化、切换人物、发送消息"""
+    rng = random.Random(session_no)
+    session = Session(port)
+    initialized = False
+    try:
+        await session.connect()
+        await session.choose("radio", "选择 API 提供商", PROVIDER)
+        await session.type_text("text_input", f"输入你的 {PROVIDER} API 密钥", f"sk-load-{session_no}")
+        initialized = True
+        ready()
+        await go.wait()
+        for turn in range(turns):
+            if turn and turn % SWITCH_EVERY == 0:
+                latencies.append(("switch", await session.click(rng.choice(PERSONA_BUTTONS))))
+            start = time.perf_counter()
+            latencies.append(("chat", await session.chat(f"会话{session_no} 第{turn}句")))
+            await session.wait_reply()
+            latencies.append(("reply", time.perf_counter() - start))
+        errors.extend(f"会话 {session_no}: {message}" for message in session.exceptions)
+    except Exception as e:
+        errors.append(f"会话 {session_no}: {type(e).__name__}: {e}")
+        if not initialized:
+            ready()
+    finally:
+        session.close()
+
+
+async def run_level(sessions_count: int, port: int, pid: int, turns: int) -> dict:
+    latencies, errors = [], []
+    rss_before, _ = process_status(pid)
+    go = asyncio.Event()
+    pending = [sessions_count]
+
+    def ready():
+        pending[0] -= 1
+
+    tasks = [
+        asyncio.create_task(run_session(n, port, turns, latencies, errors, ready, go))
+        for n in range(sessions_count)
+    ]
+    # 所有会话初始化完成后同时开始发送消息
+    while pending[0] > 0:
+        await asyncio.sleep(0.05)
+    go.set()
+    start = time.perf_counter()
+    peak_rss, peak_threads = process_status(pid)
+    while not all(task.done() for task in tasks):
+        rss, threads = process_status(pid)
+        peak_rss, peak_threads = max(peak_rss, rss), max(peak_threads, threads)
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    chat = [seconds * 1000 for kind, seconds in latencies if kind == "chat"]
+    switch = [seconds * 1000 for kind, seconds in latencies if kind == "switch"]
+    reply = [seconds * 1000 for kind, seconds in latencies if kind == "reply"]
+    return {
+        "sessions": sessions_count,
+        "chat_p50_ms": _percentile(chat, 0.5),
+        "chat_p95_ms": _percentile(chat, 0.95),
+        "switch_p50_ms": _percentile(switch, 0.5),
+        "reply_p50_ms": _percentile(reply, 0.5),
+        "turns_per_sec": len(chat) / elapsed if elapsed else 0.0,
+        "mb_per_session": max(peak_rss - rss_before, 0.0) / sessions_count,
+        "peak_threads": peak_threads,
+        "errors": errors,
+    }
+
+
+def find_collapse(results: list):
+    """吞吐第一次不再随并发明显增长的并发数"""
+    for previous, current in zip(results, results[1:]):
+        if current["turns_per_sec"] < previous["turns_per_sec"] * COLLAPSE_GAIN:
+            return current["sessions"]
+    return None
+
+
+async def main(levels: list, turns: int):
+    import mock_server
+
+    mock_port, app_port = _free_port(), _free_port()
+    env = dict(
+        os.environ,
+        CIALLO_MOCK_BASE_URL=f"http://127.0.0.1:{mock_port}/v1",
+        CIALLO_DB_PATH=os.path.join(tempfile.mkdtemp(), "load.db"),
+        CIALLO_EMOTION="0",
+    )
+    mock = mock_server.start_subprocess(mock_port, **MOCK_OPTIONS)
+    app = start_app(app_port, env)
+    try:
+        # 预热一个会话，让模块导入与缓存的一次性开销不计入每会话内存
+        await run_level(1, app_port, app.pid, 1)
+        idle_rss, idle_threads = process_status(app.pid)
+        print(f"预热后服务: {idle_rss:.1f} MB, {idle_threads} 个线程\n")
+        print(f"{'会话数':>6}{'对话p50':>10}{'对话p95':>10}{'回复p50':>10}{'切换p50':>10}{'轮/秒':>8}{'MB/会话':>9}{'线程':>6}{'错误':>6}")
+        results = []
+        for sessions_count in levels:
+            result = await run_level(sessions_count, app_port, app.pid, turns)
+            results.append(result)
+            print(
+                f"{result['sessions']:>6}{result['chat_p50_ms']:>10.0f}{result['chat_p95_ms']:>10.0f}"
+                f"{result['reply_p50_ms']:>10.0f}{result['switch_p50_ms']:>10.0f}{result['turns_per_sec']:>8.2f}"
+                f"{result['mb_per_session']:>9.2f}{result['peak_threads']:>6}{len(result['errors']):>6}"
+            )
+            for error in result["errors"][:3]:
+                print(f"    {error}")
+
+        collapse = find_collapse(results)
+        print()
+        if collapse:
+            print(f"吞吐在 {collapse} 个并发会话时不再增长（崩塌点）")
+        else:
+            print("在测试范围内吞吐随并发持续增长")
+    finally:
+        app.terminate()
+        mock.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8,16", help="逐级的并发会话数，逗号分隔")
+    parser.add_argument("--turns", type=int, default=6, help="每个会话发送的消息数")
+    args = parser.parse_args()
+    sys.path.insert(0, BASE_DIR)
+    asyncio.run(main([int(n) for n in args.levels.split(",")], args.turns))
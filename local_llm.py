@@ -0,0 +1,287 @@
+"""本地模型提供商：在 CPU 上运行小型因果语言模型
+
+LocalClient 模仿 OpenAI 客户端中 run_agent 用到的部分
+（client.chat.completions.create 与 client.base_url.host），流式与非流式的返回值
+与 OpenAI SDK 的块 / 响应结构相同，界面、遥测、前缀缓存统计无需区分提供商。
+
+每个人物的系统提示（AGENT_INSTRUCTIONS / PERSONA_CORE）在模型加载后预先编码，
+其 KV cache 常驻内存；每轮只需对系统提示之后的新 token 做预填充（prefill），
+复用的 token 数作为 usage.prompt_tokens_details.cached_tokens 上报。
+
+CPU 上并行生成只会互相抢核，同一模型的请求串行执行。
+需要额外安装 transformers 与 torch。
+"""
+import copy
+import hashlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from types import SimpleNamespace
+
+logger = logging.getLogger(__name__)
+
+LOCAL_PROVIDER = "本地模型"
+LOCAL_MODEL = os.getenv("CIALLO_LOCAL_MODEL", "Qwen/Qwen2.5-0.5B-Instruct")
+# 本地推理线程数，0 表示使用 torch 的默认值
+LOCAL_THREADS = int(os.getenv("CIALLO_LOCAL_THREADS", "0"))
+# 每个模型最多保留的系统提示前缀 KV cache 数
+PREFIX_CACHE_SIZE = int(os.getenv("CIALLO_LOCAL_PREFIX_CACHE_SIZE", "16"))
+TOP_P = 0.9
+
+
+def local_llm_available() -> bool:
+    """本地模型需要额外安装 transformers 与 torch"""
+    return all(importlib.util.find_spec(name) is not None for name in ("transformers", "torch"))
+
+
+def prefix_key(system_prompt: str) -> str:
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class LocalEngine:
+    """一份模型权重 + 按系统提示缓存的前缀 KV cache"""
+
+    def __init__(self, model_name: str, threads: int = LOCAL_THREADS):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.torch = torch
+        self.model_name = model_name
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch.float32)
+        self.model.eval()
+        eos = self.model.generation_config.eos_token_id
+        self.eos_token_ids = set(eos if isinstance(eos, list) else [eos])
+        self.lock = threading.Lock()  # 同一时刻只运行一个前向计算序列
+        self._prefixes = OrderedDict()  # 前缀摘要 -> (前缀文本, token 数, KV cache)
+
+    def _forward(self, input_ids: list, cache):
+        """对 input_ids 做一次前向，cache 原地追加，返回最后一个位置的 logits"""
+        with self.torch.inference_mode():
+            output = self.model(
+                input_ids=self.torch.tensor([input_ids]),
+                past_key_values=cache,
+                use_cache=True,
+            )
+        return output.logits[0, -1], output.past_key_values
+
+    def _prefix(self, system_prompt: str) -> tuple:
+        """系统提示的 (文本, token 数, KV cache)，未缓存时编码并保存"""
+        key = prefix_key(system_prompt)
+        with self.lock:
+            entry = self._prefixes.get(key)
+            if entry is not None:
+                self._prefixes.move_to_end(key)
+                return entry
+            from transformers import DynamicCache
+
+            text = self.tokenizer.apply_chat_template(
+                [{"role": "system", "content": system_prompt}], tokenize=False
+            )
+            ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+            _, cache = self._forward(ids, DynamicCache())
+            entry = self._prefixes[key] = (text, len(ids), cache)
+            while len(self._prefixes) > PREFIX_CACHE_SIZE:
+                self._prefixes.popitem(last=False)
+            return entry
+
+    def warm(self, system_prompts):
+        """预先编码一组系统提示"""
+        for system_prompt in dict.fromkeys(system_prompts):
+            self._prefix(system_prompt)
+
+    def prepare(self, messages: list, reuse_prefix: bool = True) -> tuple:
+        """返回 (KV cache, 待预填充的 token, 复用的 token 数)
+
+        复用时得到的是前缀 cache 的副本，生成过程不会改动缓存中的前缀。
+        渲染后的提示不以前缀文本开头时（聊天模板不兼容）退回完整预填充。
+        """
+        from transformers import DynamicCache
+
+        text = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        if reuse_prefix and messages and messages[0]["role"] == "system":
+            prefix_text, prefix_tokens, prefix_cache = self._prefix(messages[0]["content"])
+            if text.startswith(prefix_text):
+                rest = self.tokenizer(text[len(prefix_text):], add_special_tokens=False)["input_ids"]
+                return copy.deepcopy(prefix_cache), rest, prefix_tokens
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        return DynamicCache(), ids, 0
+
+    def prefill(self, cache, input_ids: list):
+        """预填充新 token，返回最后一个位置的 logits"""
+        logits, _ = self._forward(input_ids, cache)
+        return logits
+
+    def sample(self, logits, temperature: float) -> int:
+        """按温度 + top-p 采样下一个 token；温度为 0 时取最大值"""
+        torch = self.torch
+        if temperature <= 0:
+            return int(logits.argmax())
+        probs = torch.softmax(logits.float() / temperature, dim=-1)
+        sorted_probs, indices = probs.sort(descending=True)
+        sorted_probs[(sorted_probs.cumsum(-1) - sorted_probs) > TOP_P] = 0
+        return int(indices[torch.multinomial(sorted_probs, 1)])
+
+
+_engines = {}  # 模型名 -> LocalEngine
+_engines_lock = threading.Lock()
+
+
+def load_engine(model_name: str = LOCAL_MODEL) -> LocalEngine:
+    """加载模型并预先编码全部人物的系统提示（每个进程每个模型一次）
+
+    并发的首次调用（如群聊首轮的多个工作线程）只有一个真正加载，其余等待其结果。
+    """
+    engine = _engines.get(model_name)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _engines.get(model_name)
+        if engine is not None:
+            return engine
+        from personas import AGENT_INSTRUCTIONS, PERSONA_CORE
+
+        start = time.perf_counter()
+        engine = LocalEngine(model_name)
+        engine.warm(list(AGENT_INSTRUCTIONS.values()) + list(PERSONA_CORE.values()))
+        logger.info(f"本地模型 {model_name} 加载完成，用时 {time.perf_counter() - start:.1f}s")
+        _engines[model_name] = engine
+        return engine
+
+
+class LocalGeneration:
+    """一次生成：迭代得到文本增量，close() 后在下一个 token 前停止"""
+
+    def __init__(self, engine: LocalEngine, messages: list, max_tokens: int, temperature: float):
+        self.engine = engine
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.finish_reason = None
+        self._closed = False
+        self._iterator = None
+
+    def __iter__(self):
+        self._iterator = self._generate()
+        return self._iterator
+
+    def _generate(self):
+        engine = self.engine
+        cache, input_ids, self.cached_tokens = engine.prepare(self.messages)
+        self.prompt_tokens = self.cached_tokens + len(input_ids)
+        with engine.lock:
+            logits = engine.prefill(cache, input_ids)
+            generated = []
+            emitted = ""
+            while not self._closed:
+                token = engine.sample(logits, self.temperature)
+                if token in engine.eos_token_ids:
+                    self.finish_reason = "stop"
+                    break
+                generated.append(token)
+                self.completion_tokens += 1
+                text = engine.tokenizer.decode(generated, skip_special_tokens=True)
+                # 多字节字符可能跨 token，解码出替换字符时等下一个 token
+                if not text.endswith("\ufffd") and len(text) > len(emitted):
+                    yield text[len(emitted):]
+                    emitted = text
+                if self.completion_tokens >= self.max_tokens:
+                    self.finish_reason = "length"
+                    break
+                logits = engine.prefill(cache, [token])
+
+    def close(self):
+        self._closed = True
+        # 已暂停的生成器立即结束并释放模型锁；正在其他线程中运行时由 _closed 标记停止
+        if self._iterator is not None:
+            try:
+                self._iterator.close()
+            except ValueError:
+                pass
+
+    def usage(self):
+        return SimpleNamespace(
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            total_tokens=self.prompt_tokens + self.completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=self.cached_tokens),
+        )
+
+
+def _chunk(completion_id: str, model: str, content: str = None, finish_reason: str = None, usage=None):
+    """与 OpenAI 流式块结构相同的对象"""
+    choices = [] if usage is not None else [SimpleNamespace(
+        index=0, delta=SimpleNamespace(role="assistant", content=content), finish_reason=finish_reason
+    )]
+    return SimpleNamespace(id=completion_id, object="chat.completion.chunk", model=model,
+                           choices=choices, usage=usage)
+
+
+class LocalStream:
+    """流式响应：逐 token 生成并产出块，include_usage 时最后附加 usage 块"""
+
+    def __init__(self, generation: LocalGeneration, model: str, include_usage: bool):
+        self.generation = generation
+        self.model = model
+        self.include_usage = include_usage
+        self.id = f"chatcmpl-local-{uuid.uuid4().hex[:12]}"
+
+    def __iter__(self):
+        for delta in self.generation:
+            yield _chunk(self.id, self.model, content=delta)
+        yield _chunk(self.id, self.model, finish_reason=self.generation.finish_reason or "stop")
+        if self.include_usage:
+            yield _chunk(self.id, self.model, usage=self.generation.usage())
+
+    def close(self):
+        self.generation.close()
+
+
+class _Completions:
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def create(self, model: str, messages: list, temperature: float = 0.7, max_tokens: int = 1024,
+               stream: bool = False, stream_options: dict = None, **_):
+        """与 OpenAI chat.completions.create 相同的调用方式；model 参数仅作标识，始终使用本地模型"""
+        generation = LocalGeneration(load_engine(self.model_name), messages, max_tokens, temperature)
+        if stream:
+            include_usage = bool(stream_options and stream_options.get("include_usage"))
+            return LocalStream(generation, self.model_name, include_usage)
+        content = "".join(generation)
+        return SimpleNamespace(
+            id=f"chatcmpl-local-{uuid.uuid4().hex[:12]}",
+            object="chat.completion",
+            model=self.model_name,
+            choices=[SimpleNamespace(
+                index=0,
+                message=SimpleNamespace(role="assistant", content=content),
+                finish_reason=generation.finish_reason or "stop",
+            )],
+            usage=generation.usage(),
+        )
+
+
+class LocalClient:
+    """提供 run_agent 所需接口的本地客户端"""
+
+    def __init__(self, model_name: str = LOCAL_MODEL):
+        self.model_name = model_name
+        self.base_url = SimpleNamespace(host="local")
+        self.chat = SimpleNamespace(completions=_Completions(model_name))
+
+
+@lru_cache(maxsize=None)
+def get_local_client(model_name: str = LOCAL_MODEL) -> LocalClient:
+    """进程级单例：所有会话共享一份本地模型"""
+    return LocalClient(model_name)
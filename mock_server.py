@@ -0,0 +1,159 @@
+"""本地 OpenAI 兼容模拟服务
+
+实现 /v1/chat/completions（流式与非流式）和 /v1/models，
+首 token 延迟、生成速度、错误率、每块字符数均可配置，用于离线基准测试。
+
+启动: python mock_server.py --port 9000 --ttft-ms 300 --tokens-per-sec 50
+让界面使用它: CIALLO_MOCK_BASE_URL=http://127.0.0.1:9000/v1 streamlit run app.py
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+import urllib.request
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# 默认配置，可通过命令行参数覆盖
+CONFIG = {
+    "ttft_ms": 200,
+    "tokens_per_sec": 60,
+    "chunk_chars": 1,
+    "reply_chars": 300,
+    "error_rate": 0.0,
+    "cached_ratio": 0.8,
+}
+
+REPLY_TEXT = "哼，本座才不是小孩子呢！狗修金，今天也要好好练刀哦。供奉仪式就快到了，本座会一直看着你的。"
+
+app = FastAPI(title="Mock OpenAI")
+
+
+def _reply() -> str:
+    text = REPLY_TEXT * (CONFIG["reply_chars"] // len(REPLY_TEXT) + 1)
+    return text[:CONFIG["reply_chars"]]
+
+
+def _usage(messages: list, completion_tokens: int) -> dict:
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages)
+    cached = int(prompt_tokens * CONFIG["cached_ratio"])
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_cache_hit_tokens": cached,
+        "prompt_cache_miss_tokens": prompt_tokens - cached,
+        "prompt_tokens_details": {"cached_tokens": cached},
+    }
+
+
+def _maybe_error():
+    if random.random() >= CONFIG["error_rate"]:
+        return None
+    if random.random() < 0.5:
+        return JSONResponse({"error": {"message": "rate limited"}}, status_code=429, headers={"Retry-After": "0.1"})
+    return JSONResponse({"error": {"message": "upstream overloaded"}}, status_code=503)
+
+
+@app.get("/v1/models")
+@app.get("/models")
+async def list_models():
+    return {
+        "object": "list",
+        "data": [{"id": name, "object": "model", "created": 0, "owned_by": "mock"}
+                 for name in ("mock-chat", "deepseek-chat", "deepseek-ai/DeepSeek-V3")],
+    }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    error = _maybe_error()
+    if error is not None:
+        return error
+
+    text = _reply()
+    max_tokens = body.get("max_tokens")
+    if max_tokens:
+        text = text[:max_tokens]
+    chunk_chars = max(CONFIG["chunk_chars"], 1)
+    pieces = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)]
+    usage = _usage(body.get("messages", []), len(text))
+    base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": body.get("model", "mock-chat")}
+
+    if not body.get("stream"):
+        await asyncio.sleep(CONFIG["ttft_ms"] / 1000 + len(text) / CONFIG["tokens_per_sec"])
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+    async def events():
+        await asyncio.sleep(CONFIG["ttft_ms"] / 1000)
+        interval = chunk_chars / CONFIG["tokens_per_sec"]
+        for i, piece in enumerate(pieces):
+            if i:
+                await asyncio.sleep(interval)
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        final = {**base, "object": "chat.completion.chunk",
+                 "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        yield f"data: {json.dumps(final)}\n\n"
+        if include_usage:
+            yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--ttft-ms", type=float, default=CONFIG["ttft_ms"])
+    parser.add_argument("--tokens-per-sec", type=float, default=CONFIG["tokens_per_sec"])
+    parser.add_argument("--chunk-chars", type=int, default=CONFIG["chunk_chars"])
+    parser.add_argument("--reply-chars", type=int, default=CONFIG["reply_chars"])
+    parser.add_argument("--error-rate", type=float, default=CONFIG["error_rate"])
+    parser.add_argument("--cached-ratio", type=float, default=CONFIG["cached_ratio"])
+    return parser.parse_args(argv)
+
+
+def start_subprocess(port: int, **options) -> subprocess.Popen:
+    """在子进程中启动模拟服务并等待就绪（基准测试用，避免与被测进程争抢 CPU）"""
+    args = [sys.executable, __file__, "--port", str(port)]
+    for name, value in options.items():
+        args += [f"--{name.replace('_', '-')}", str(value)]
+    process = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/v1/models", timeout=1)
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("模拟服务启动失败")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    CONFIG.update(
+        ttft_ms=args.ttft_ms,
+        tokens_per_sec=args.tokens_per_sec,
+        chunk_chars=args.chunk_chars,
+        reply_chars=args.reply_chars,
+        error_rate=args.error_rate,
+        cached_ratio=args.cached_ratio,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,117 @@
+"""进程级模型列表缓存
+
+按 (提供商, 密钥摘要) 缓存模型列表：
+- TTL 内直接返回缓存
+- 过期但仍在 stale 窗口内时先返回旧值，并在后台刷新（stale-while-revalidate）
+- 同一键的并发请求合并为一次上游调用（single-flight）
+"""
+import logging
+import os
+import threading
+import time
+
+import requests
+
+from client_pool import MOCK_BASE_URL, hash_api_key
+
+logger = logging.getLogger(__name__)
+
+# 各提供商的模型列表接口
+MODELS_URLS = {
+    "硅基流动 (SiliconFlow)": "https://api.siliconflow.cn/v1/models",
+    "DeepSeek": "https://api.deepseek.com/models",
+}
+
+CATALOG_TTL = float(os.getenv("CIALLO_CATALOG_TTL", "600"))
+CATALOG_STALE_TTL = float(os.getenv("CIALLO_CATALOG_STALE_TTL", "3600"))
+CONNECT_TIMEOUT = float(os.getenv("CIALLO_CATALOG_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("CIALLO_CATALOG_READ_TIMEOUT", "8"))
+
+
+class _Flight:
+    """一次正在进行的上游请求"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+
+class ModelCatalog:
+    """带 TTL、stale-while-revalidate 与 single-flight 的模型列表缓存"""
+
+    def __init__(self, ttl: float = CATALOG_TTL, stale_ttl: float = CATALOG_STALE_TTL):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._cache = {}    # key -> (fetched_at, models)
+        self._flights = {}  # key -> _Flight
+        self._session = requests.Session()
+        self.upstream_calls = 0
+
+    def get(self, api_provider: str, api_key: str) -> list:
+        """获取模型列表，失败时返回空列表"""
+        key = (api_provider, hash_api_key(api_key))
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                age = now - cached[0]
+                if age < self.ttl:
+                    return cached[1]
+                if age < self.stale_ttl:
+                    # 先返回旧值，后台刷新
+                    if key not in self._flights:
+                        flight = self._flights[key] = _Flight()
+                        threading.Thread(
+                            target=self._run_flight,
+                            args=(key, flight, api_provider, api_key),
+                            daemon=True,
+                        ).start()
+                    return cached[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if leader:
+            self._run_flight(key, flight, api_provider, api_key)
+        else:
+            flight.done.wait(CONNECT_TIMEOUT + READ_TIMEOUT + 1)
+        return flight.result or []
+
+    def peek(self, api_provider: str, api_key: str) -> list:
+        """只读取缓存，不触发请求"""
+        cached = self._cache.get((api_provider, hash_api_key(api_key)))
+        return cached[1] if cached else []
+
+    def _run_flight(self, key, flight: _Flight, api_provider: str, api_key: str):
+        try:
+            models = self._fetch(api_provider, api_key)
+            if models:
+                with self._lock:
+                    self._cache[key] = (time.time(), models)
+            flight.result = models
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _fetch(self, api_provider: str, api_key: str) -> list:
+        try:
+            self.upstream_calls += 1
+            headers = {"Authorization": f"Bearer {api_key}", "Accept": "application/json"}
+            response = self._session.get(
+                f"{MOCK_BASE_URL}/models" if MOCK_BASE_URL else MODELS_URLS[api_provider],
+                headers=headers,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+            response.raise_for_status()
+
+            models_data = response.json()
+            return [model["id"] for model in models_data.get("data", [])]
+        except Exception as e:
+            logger.error(f"获取{api_provider}模型列表失败: {str(e)}")
+            return []
+
+
+# 进程级单例
+model_catalog = ModelCatalog()
@@ -0,0 +1,91 @@
+"""经典台词检索
+
+进程启动时为每个人物的台词语料建立本地向量索引（字符 1-2 gram 的 TF-IDF），
+每轮只取与当前用户消息和最近几轮最相关的 top-k 句，代替发送全部台词。
+"""
+import math
+import os
+from collections import Counter
+
+import numpy as np
+
+from personas import PERSONA_EXAMPLES
+
+EXAMPLES_TOP_K = int(os.getenv("CIALLO_EXAMPLES_TOP_K", "8"))
+# 参与检索的最近消息数（不含当前用户消息）
+QUERY_RECENT_MESSAGES = 2
+# 最近消息在查询向量中的权重
+RECENT_WEIGHT = 0.5
+
+
+def _ngrams(text: str) -> list:
+    chars = [c for c in text if not c.isspace()]
+    return chars + [a + b for a, b in zip(chars, chars[1:])]
+
+
+class ExampleIndex:
+    """单个人物台词的 TF-IDF 索引"""
+
+    def __init__(self, lines: list):
+        self.lines = lines
+        docs = [Counter(_ngrams(line)) for line in lines]
+        df = Counter(term for doc in docs for term in doc)
+        self.vocab = {term: i for i, term in enumerate(df)}
+        n = len(lines)
+        self.idf = np.array(
+            [math.log((1 + n) / (1 + df[term])) + 1 for term in self.vocab],
+            dtype=np.float32,
+        )
+        self.matrix = np.zeros((n, len(self.vocab)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            for term, count in doc.items():
+                self.matrix[row, self.vocab[term]] = count
+        self.matrix *= self.idf
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.maximum(norms, 1e-8)
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        for term, count in Counter(_ngrams(text)).items():
+            index = self.vocab.get(term)
+            if index is not None:
+                vector[index] = count
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def search(self, query: str, recent: str = "", k: int = EXAMPLES_TOP_K) -> list:
+        """返回最相关的 k 句，按语料原顺序排列"""
+        if len(self.lines) <= k:
+            return list(self.lines)
+        vector = self._vector(query)
+        if recent:
+            vector = vector + RECENT_WEIGHT * self._vector(recent)
+        scores = self.matrix @ vector
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [self.lines[i] for i in sorted(top)]
+
+
+# 进程启动时建立索引
+EXAMPLE_INDEXES = {agent: ExampleIndex(lines) for agent, lines in PERSONA_EXAMPLES.items()}
+
+
+def needs_retrieval(agent: str, k: int = EXAMPLES_TOP_K) -> bool:
+    """台词不多于 k 句时直接随系统提示整体发送"""
+    return len(PERSONA_EXAMPLES[agent]) > k
+
+
+def retrieve_examples(agent: str, history: list, k: int = EXAMPLES_TOP_K) -> list:
+    """根据最新用户消息和最近几轮检索台词"""
+    query = history[-1]["content"] if history else ""
+    recent = " ".join(m["content"] for m in history[-1 - QUERY_RECENT_MESSAGES:-1])
+    return EXAMPLE_INDEXES[agent].search(query, recent, k)
+
+
+def examples_message(agent: str, history: list, k: int = EXAMPLES_TOP_K) -> dict:
+    """把检索到的台词包装成插在最新用户消息之前的系统消息
+
+    放在历史之后而不是系统提示里，系统提示与历史仍是逐字节稳定的前缀。
+    """
+    lines = retrieve_examples(agent, history, k)
+    return {"role": "system", "content": "经典台词（参考语气）:\n" + "\n".join(lines)}
@@ -0,0 +1,75 @@
+"""提供商前缀缓存命中统计
+
+DeepSeek 与 OpenAI 都会对重复的提示前缀打折，前提是前缀逐字节不变。
+这里读取各家 usage 中的缓存字段，按人物统计命中率，并检查系统提示前缀是否稳定。
+"""
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# 流式请求时需要显式开启 include_usage 的提供商
+STREAM_USAGE_PROVIDERS = {"OpenAI 官方", "DeepSeek", "本地模型"}
+
+
+def extract_usage(usage) -> tuple:
+    """从 usage 中读取 (prompt_tokens, cached_tokens)"""
+    if usage is None:
+        return 0, 0
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    # DeepSeek: prompt_cache_hit_tokens / prompt_cache_miss_tokens
+    cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    if cached is None:
+        # OpenAI 及兼容接口: prompt_tokens_details.cached_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+    return prompt_tokens, cached or 0
+
+
+def prefix_fingerprint(messages: list) -> str:
+    """系统提示前缀的摘要"""
+    prefix = "".join(m["content"] for m in messages if m["role"] == "system")
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
+
+
+class PromptCacheStats:
+    """按人物统计前缀缓存命中率（进程级）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._fingerprints = {}
+
+    def check_prefix(self, persona: str, messages: list):
+        """记录人物的系统前缀，变化时告警（前缀变化会使缓存失效）"""
+        fingerprint = prefix_fingerprint(messages[:1])
+        with self._lock:
+            previous = self._fingerprints.get(persona)
+            self._fingerprints[persona] = fingerprint
+        if previous and previous != fingerprint:
+            logger.warning(f"{persona} 的系统提示前缀发生变化，前缀缓存将失效")
+
+    def record(self, persona: str, usage):
+        prompt_tokens, cached_tokens = extract_usage(usage)
+        if not prompt_tokens:
+            return
+        with self._lock:
+            stats = self._stats.setdefault(persona, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0})
+            stats["requests"] += 1
+            stats["prompt_tokens"] += prompt_tokens
+            stats["cached_tokens"] += cached_tokens
+
+    def hit_ratio(self, persona: str) -> float:
+        stats = self._stats.get(persona)
+        if not stats or not stats["prompt_tokens"]:
+            return 0.0
+        return stats["cached_tokens"] / stats["prompt_tokens"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {persona: dict(stats) for persona, stats in self._stats.items()}
+
+
+# 进程级单例
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,234 @@
+"""重试、退避与按提供商熔断
+
+- 可重试错误（429、5xx、连接失败 / 超时）按带抖动的指数退避重试，并遵守 Retry-After
+  （要求等待超过 CIALLO_RETRY_MAX_WAIT 时直接失败）
+- 不可重试错误（401、400 等）立即失败
+- 同一提供商连续失败（限流 429 与冲突 409 除外）达到阈值后熔断，冷却期内直接失败，不再让每个用户都等满超时
+"""
+import email.utils
+import logging
+import os
+import threading
+import time
+
+from tenacity import (
+    AsyncRetrying,
+    Retrying,
+    retry_if_exception,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = int(os.getenv("CIALLO_RETRY_ATTEMPTS", "3"))
+RETRY_MAX_WAIT = float(os.getenv("CIALLO_RETRY_MAX_WAIT", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIALLO_BREAKER_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("CIALLO_BREAKER_RESET_TIMEOUT", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# 只重试、不计入熔断的状态码：限流与冲突取决于单个密钥 / 请求，不代表提供商故障，
+# 而熔断器按提供商主机在所有会话间共享
+BREAKER_EXEMPT_STATUS = {409, 429}
+
+
+class AgentError(Exception):
+    """调用模型失败；retryable 表示是否属于临时性错误"""
+
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class CircuitOpenError(AgentError):
+    """提供商已熔断"""
+
+
+def is_retryable(error: Exception) -> bool:
+    """区分可重试错误与致命错误"""
+    # 走到这里时 SDK 必然已经加载，不影响冷启动
+    import openai
+
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS or error.status_code >= 500
+    return False
+
+
+def trips_breaker(error: Exception, agent_error: AgentError) -> bool:
+    """失败是否计入提供商的熔断器"""
+    return agent_error.retryable and getattr(error, "status_code", None) not in BREAKER_EXEMPT_STATUS
+
+
+def retry_after_seconds(error: Exception):
+    """读取 Retry-After / retry-after-ms 响应头"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        # 格式错误的日期按没有该响应头处理，退回指数退避
+        return None
+    return max(parsed.timestamp() - time.time(), 0) if parsed else None
+
+
+def _outcome_retry_after(retry_state):
+    error = retry_state.outcome.exception()
+    return retry_after_seconds(error) if error else None
+
+
+class _WaitRetryAfter:
+    """优先使用服务端给出的 Retry-After，否则带抖动指数退避"""
+
+    def __init__(self):
+        self._fallback = wait_random_exponential(multiplier=0.5, max=RETRY_MAX_WAIT)
+
+    def __call__(self, retry_state) -> float:
+        delay = _outcome_retry_after(retry_state)
+        if delay is not None:
+            return delay
+        return self._fallback(retry_state)
+
+
+def _stop_retry_after_too_long(retry_state) -> bool:
+    """服务端要求的等待超过 RETRY_MAX_WAIT 时不再重试，而不是提前重试"""
+    delay = _outcome_retry_after(retry_state)
+    return delay is not None and delay > RETRY_MAX_WAIT
+
+
+class CircuitBreaker:
+    """单个提供商的熔断器：closed -> open -> half-open"""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial_in_flight):
+                remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+                raise CircuitOpenError(f"{self.name} 暂时不可用（熔断中，约 {max(remaining, 0):.0f} 秒后重试）")
+            if state == "half-open":
+                # 冷却结束后只放行一个试探请求
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """结束试探请求但不改变熔断状态（如用户自身的密钥错误）"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.error(f"{self.name} 连续失败 {self.failures} 次，已熔断")
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_states() -> dict:
+    """各提供商的熔断状态"""
+    with _breakers_lock:
+        return {name: breaker.state for name, breaker in _breakers.items()}
+
+
+def _retrying_options() -> dict:
+    return dict(
+        retry=retry_if_exception(is_retryable),
+        wait=_WaitRetryAfter(),
+        stop=stop_after_attempt(RETRY_ATTEMPTS) | _stop_retry_after_too_long,
+        reraise=True,
+    )
+
+
+def _to_agent_error(error: Exception) -> AgentError:
+    if isinstance(error, AgentError):
+        return error
+    return AgentError(str(error), retryable=is_retryable(error))
+
+
+def call_with_resilience(name: str, func):
+    """在熔断器保护下带重试地调用 func()"""
+    breaker = get_breaker(name)
+    breaker.before_call()
+    try:
+        for attempt in Retrying(**_retrying_options()):
+            with attempt:
+                result = func()
+    except Exception as e:
+        error = _to_agent_error(e)
+        # 只有提供商侧的临时性错误才计入熔断；密钥错误、限流等既不代表提供商故障，也不代表其恢复
+        if trips_breaker(e, error):
+            breaker.record_failure()
+        else:
+            breaker.release_trial()
+        raise error from e
+    breaker.record_success()
+    return result
+
+
+async def acall_with_resilience(name: str, func):
+    """call_with_resilience 的异步版本，func 返回协程"""
+    breaker = get_breaker(name)
+    breaker.before_call()
+    try:
+        async for attempt in AsyncRetrying(**_retrying_options()):
+            with attempt:
+                result = await func()
+    except Exception as e:
+        error = _to_agent_error(e)
+        if trips_breaker(e, error):
+            breaker.record_failure()
+        else:
+            breaker.release_trial()
+        raise error from e
+    breaker.record_success()
+    return result
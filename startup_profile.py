@@ -0,0 +1,121 @@
+"""冷启动耗时分析
+
+设置 CIALLO_PROFILE_STARTUP=1 后，记录 app.py 首次执行期间新导入的每个模块的耗时
+（按最外层 import 语句统计，含其依赖）和各阶段耗时，首次 rerun 结束时打印一次明细。
+未开启时所有函数都是空操作。
+import 钩子只统计首次运行的线程；首次运行在 finish() 之前中断时，下一次运行开始即恢复原函数。
+
+    CIALLO_PROFILE_STARTUP=1 streamlit run app.py
+"""
+import builtins
+import os
+import sys
+import threading
+import time
+
+ENABLED = os.getenv("CIALLO_PROFILE_STARTUP", "0") == "1"
+# 明细中最多列出的模块数
+TOP_IMPORTS = 15
+
+
+def _process_uptime():
+    """进程已运行的秒数（读取 /proc，其他平台返回 None）"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupProfile:
+    """首次 rerun 的导入与阶段计时"""
+
+    def __init__(self):
+        self.imports = []  # (模块名, 毫秒)
+        self.phases = []   # (阶段名, 毫秒)
+        self.started_at = None
+        self.done = False
+        self._last_mark = None
+        self._local = threading.local()
+        self._original_import = None
+        self._thread = None
+
+    def begin(self):
+        if self.started_at is not None:
+            if not self.done:
+                # 首次运行在 finish() 之前抛出了异常（或被 rerun / stop 打断）：
+                # 恢复 import 钩子，只打印已有的部分明细
+                self.finish(complete=False)
+            return
+        self.started_at = self._last_mark = time.perf_counter()
+        self._thread = threading.get_ident()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def _restore_import(self):
+        if builtins.__import__ == self._import:
+            builtins.__import__ = self._original_import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        depth = getattr(self._local, "depth", 0)
+        # 只统计运行首次 rerun 的线程，其他线程（后台工作线程等）直接放行
+        if depth or level or name in sys.modules or threading.get_ident() != self._thread:
+            return self._original_import(name, globals, locals, fromlist, level)
+        self._local.depth = 1
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._local.depth = 0
+            self.imports.append((name, (time.perf_counter() - start) * 1000))
+
+    def mark(self, phase: str):
+        if self.started_at is None or self.done:
+            return
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self._last_mark) * 1000))
+        self._last_mark = now
+
+    def finish(self, complete: bool = True):
+        """结束计时并打印明细（只打印一次）"""
+        if self.started_at is None or self.done:
+            return
+        self.done = True
+        self._restore_import()
+        if complete:
+            self.mark("其余")
+        total = (time.perf_counter() - self.started_at) * 1000
+        uptime = _process_uptime()
+
+        lines = ["", "===== 冷启动分析 =====" if complete else "===== 冷启动分析（首次 rerun 未正常结束，仅部分明细）====="]
+        if complete and uptime is not None:
+            lines.append(f"首次 rerun 结束时进程已运行: {uptime * 1000:.0f} ms")
+        if complete:
+            lines.append(f"首次 rerun: {total:.0f} ms")
+        lines.append("阶段:")
+        lines += [f"  {name:<12}{ms:>8.1f} ms" for name, ms in self.phases]
+        lines.append(f"新导入的模块（前 {TOP_IMPORTS} 个，含依赖）:")
+        for name, ms in sorted(self.imports, key=lambda item: -item[1])[:TOP_IMPORTS]:
+            lines.append(f"  {name:<28}{ms:>8.1f} ms")
+        print("\n".join(lines), file=sys.stderr, flush=True)
+
+
+_profile = StartupProfile()
+
+
+def begin():
+    if ENABLED:
+        _profile.begin()
+
+
+def mark(phase: str):
+    if ENABLED:
+        _profile.mark(phase)
+
+
+def finish():
+    if ENABLED:
+        _profile.finish()
@@ -0,0 +1,65 @@
+"""流式响应的节流渲染
+
+工作线程逐块写入增量，聊天片段按 RENDER_INTERVAL 轮询显示。若每次轮询都显示最新全文，
+刷新节奏就完全取决于上游的分块方式；这里按时间窗口 / 块数合并增量，
+遇到句末或流结束时立即刷新，界面只显示最近一次刷新的文本。
+"""
+import os
+import threading
+import time
+
+RENDER_INTERVAL = float(os.getenv("CIALLO_RENDER_INTERVAL_MS", "50")) / 1000
+RENDER_MAX_CHUNKS = int(os.getenv("CIALLO_RENDER_MAX_CHUNKS", "32"))
+
+# 遇到这些字符时视为句子结束，立即刷新
+SENTENCE_ENDINGS = "。！？!?…\n"
+
+
+class ThrottledRenderer:
+    """合并流式增量，限制可见文本的更新频率（工作线程 feed，界面读取 visible）"""
+
+    def __init__(self, interval: float = RENDER_INTERVAL, max_chunks: int = RENDER_MAX_CHUNKS):
+        self.interval = interval
+        self.max_chunks = max_chunks
+        self.text = ""
+        self.visible = ""
+        self.chunks_received = 0
+        self.frames_pushed = 0
+        self._pending = 0
+        self._last_push = 0.0
+        self._lock = threading.Lock()
+
+    def feed(self, delta: str):
+        """追加一段增量，满足条件时刷新可见文本"""
+        if not delta:
+            return
+        with self._lock:
+            self.text += delta
+            self.chunks_received += 1
+            self._pending += 1
+            tail = delta.rstrip(" ")[-1:]
+            if (
+                time.monotonic() - self._last_push >= self.interval
+                or (self.max_chunks and self._pending >= self.max_chunks)
+                or (tail and tail in SENTENCE_ENDINGS)
+            ):
+                self._push()
+
+    def finish(self) -> str:
+        """流结束：刷新剩余的增量"""
+        with self._lock:
+            if self._pending:
+                self._push()
+            return self.text
+
+    def _push(self):
+        self.visible = self.text
+        self.frames_pushed += 1
+        self._pending = 0
+        self._last_push = time.monotonic()
+
+    def stats(self) -> dict:
+        return {
+            "chunks_received": self.chunks_received,
+            "frames_pushed": self.frames_pushed,
+        }
@@ -0,0 +1,97 @@
+"""后台滚动摘要
+
+把每个人物最早的若干轮对话折叠进一条滚动摘要，摘要覆盖到的原始消息
+不再随请求发送。摘要在两轮之间由后台线程生成，用户的下一条消息无需等待。
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from context_window import count_message_tokens
+from local_llm import LOCAL_PROVIDER
+from personas import AGENT_NAMES
+
+logger = logging.getLogger(__name__)
+
+# 各提供商用于摘要的廉价模型
+SUMMARY_MODELS = {
+    "OpenAI 官方": "gpt-4o-mini",
+    "硅基流动 (SiliconFlow)": "Qwen/Qwen2.5-7B-Instruct",
+    "DeepSeek": "deepseek-chat",
+}
+
+# 未摘要部分超过该 token 数时触发摘要
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("CIALLO_SUMMARY_TRIGGER_TOKENS", "3000"))
+# 始终保留原文的最近消息数
+SUMMARY_KEEP_RECENT = int(os.getenv("CIALLO_SUMMARY_KEEP_RECENT", "8"))
+SUMMARY_MAX_TOKENS = 512
+
+SUMMARY_PROMPT = (
+    "你是对话记录员。请把下面的角色扮演对话合并进已有摘要，"
+    "保留用户的称呼、偏好、约定和发生过的事件，用第三人称简要叙述，不超过300字。"
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("CIALLO_SUMMARY_WORKERS", "2")),
+    thread_name_prefix="summarizer",
+)
+
+
+def new_summary_state() -> dict:
+    """单个人物的摘要状态"""
+    return {"content": "", "covered": 0, "pending": False}
+
+
+def summary_message(state: dict):
+    """把摘要包装成附加在系统提示之后的消息"""
+    if not state["content"]:
+        return None
+    return {"role": "system", "content": f"此前对话摘要：{state['content']}"}
+
+
+def maybe_schedule(state: dict, history: list, client, api_provider: str):
+    """未摘要部分过长时，提交后台摘要任务
+
+    本地模型的前向计算是串行的，后台摘要会让用户的下一条回复排在它后面，
+    因此不做摘要，超出预算的旧消息由上下文窗口直接裁掉。
+    """
+    if state["pending"] or api_provider == LOCAL_PROVIDER:
+        return
+    # 只折叠到最近若干条之前，并以完整轮次结尾
+    end = len(history) - max(SUMMARY_KEEP_RECENT, 1)
+    while end > state["covered"] and history[end]["role"] != "user":
+        end -= 1
+    if end <= state["covered"]:
+        return
+    pending_tokens = sum(count_message_tokens(m) for m in history[state["covered"]:])
+    if pending_tokens < SUMMARY_TRIGGER_TOKENS:
+        return
+
+    state["pending"] = True
+    turns = list(history[state["covered"]:end])
+    model = SUMMARY_MODELS.get(api_provider, "deepseek-chat")
+    _executor.submit(_summarize, state, turns, end, client, model)
+
+
+def _summarize(state: dict, turns: list, end: int, client, model: str):
+    try:
+        transcript = "\n".join(
+            f"{'用户' if m['role'] == 'user' else AGENT_NAMES.get(m.get('speaker'), '角色')}：{m['content']}" for m in turns
+        )
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"已有摘要：{state['content'] or '无'}\n\n新对话：\n{transcript}"},
+            ],
+            temperature=0.3,
+            max_tokens=SUMMARY_MAX_TOKENS,
+        )
+        content = response.choices[0].message.content
+        if content:
+            state["content"] = content.strip()
+            state["covered"] = end
+    except Exception as e:
+        logger.error(f"生成对话摘要失败: {str(e)}")
+    finally:
+        state["pending"] = False
@@ -0,0 +1,172 @@
+"""每次请求的延迟与 token 遥测
+
+记录首 token 延迟、token 间隔分位数、tokens/s、总耗时与提示 / 生成 token 数，
+按提供商、模型、人物打标签，保存在进程级环形缓冲区中，可导出为 JSONL。
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# 进程启动时间（模块只会加载一次）
+PROCESS_START = time.time()
+
+TELEMETRY_SIZE = int(os.getenv("CIALLO_TELEMETRY_SIZE", "2000"))
+
+
+def percentile(values: list, p: float):
+    """线性插值分位数，values 需已排序"""
+    if not values:
+        return None
+    k = (len(values) - 1) * p
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+class TelemetryBuffer:
+    """进程级环形缓冲区"""
+
+    def __init__(self, size: int = TELEMETRY_SIZE):
+        self._lock = threading.Lock()
+        self._records = deque(maxlen=size)
+
+    def add(self, record: dict):
+        with self._lock:
+            self._records.append(record)
+
+    def records(self) -> list:
+        with self._lock:
+            return list(self._records)
+
+    def export_jsonl(self) -> str:
+        return "\n".join(json.dumps(r, ensure_ascii=False) for r in self.records())
+
+
+telemetry_buffer = TelemetryBuffer()
+
+
+class RequestTimer:
+    """单次请求的计时器"""
+
+    def __init__(self, tags: dict, stream: bool, max_tokens: int = None):
+        self.tags = tags
+        self.stream = stream
+        self.max_tokens = max_tokens
+        self.started_at = time.perf_counter()
+        self.token_times = []
+        self.finished = False
+
+    def on_token(self):
+        self.token_times.append(time.perf_counter())
+
+    def finish(self, usage=None, error: str = None, cancelled: bool = False):
+        if self.finished:
+            return
+        self.finished = True
+        end = time.perf_counter()
+        total = end - self.started_at
+        gaps = sorted((b - a) * 1000 for a, b in zip(self.token_times, self.token_times[1:]))
+        ttft = (self.token_times[0] - self.started_at) if self.token_times else (None if self.stream else total)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) if usage else None
+        completion_tokens = getattr(usage, "completion_tokens", None) if usage else None
+        if completion_tokens is None and self.token_times:
+            # 没有 usage 时按内容块数估算
+            completion_tokens = len(self.token_times)
+        generation_time = (end - self.token_times[0]) if len(self.token_times) > 1 else None
+        # 提前取消时最多节省的 token：max_tokens 减去已生成的部分（上限，实际生成可能更早结束）；
+        # 未设置 max_tokens 时无从估计
+        max_saved_tokens = (
+            max(self.max_tokens - (completion_tokens or 0), 0) if cancelled and self.max_tokens else None
+        )
+        telemetry_buffer.add({
+            "ts": time.time(),
+            **self.tags,
+            "stream": self.stream,
+            "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "total_ms": round(total * 1000, 1),
+            "gap_p50_ms": _round(percentile(gaps, 0.5)),
+            "gap_p95_ms": _round(percentile(gaps, 0.95)),
+            "gap_p99_ms": _round(percentile(gaps, 0.99)),
+            "tokens_per_sec": round(completion_tokens / generation_time, 1)
+            if completion_tokens and generation_time else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "error": error,
+            "cancelled": cancelled,
+            "max_saved_tokens": max_saved_tokens,
+        })
+
+
+def cancellation_summary(records: list) -> tuple:
+    """(取消次数, 最多节省的 token 总数)；没有可估计的取消记录时后者为 None"""
+    cancelled = [r for r in records if r.get("cancelled")]
+    bounds = [r["max_saved_tokens"] for r in cancelled if r.get("max_saved_tokens") is not None]
+    return len(cancelled), sum(bounds) if bounds else None
+
+
+def _round(value):
+    return round(value, 1) if value is not None else None
+
+
+def _has_content(chunk) -> bool:
+    return bool(chunk.choices and chunk.choices[0].delta.content)
+
+
+class InstrumentedStream:
+    """包装流式响应：迭代时记录 token 时间，结束时写入遥测"""
+
+    def __init__(self, response, timer: RequestTimer):
+        self.response = response
+        self.timer = timer
+
+    def __iter__(self):
+        usage = None
+        try:
+            for chunk in self.response:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if _has_content(chunk):
+                    self.timer.on_token()
+                yield chunk
+        except Exception as e:
+            self.timer.finish(usage, error=str(e))
+            raise
+        except GeneratorExit:
+            self.timer.finish(usage, cancelled=True)
+            raise
+        self.timer.finish(usage)
+
+    def close(self):
+        self.timer.finish(cancelled=True)
+        self.response.close()
+
+
+class InstrumentedAsyncStream:
+    """InstrumentedStream 的异步版本"""
+
+    def __init__(self, response, timer: RequestTimer):
+        self.response = response
+        self.timer = timer
+
+    async def __aiter__(self):
+        usage = None
+        try:
+            async for chunk in self.response:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if _has_content(chunk):
+                    self.timer.on_token()
+                yield chunk
+        except Exception as e:
+            self.timer.finish(usage, error=str(e))
+            raise
+        except GeneratorExit:
+            self.timer.finish(usage, cancelled=True)
+            raise
+        self.timer.finish(usage)
+
+    async def close(self):
+        self.timer.finish(cancelled=True)
+        await self.response.close()